@@ -0,0 +1,8 @@
+"""Benchmarks com dados sintéticos do DataManager e das telas.
+
+Uso (a partir da raiz do repositório, contra um Postgres local descartável):
+
+    python -m benchmarks.run --url postgresql://localhost/onboarding_bench --reset \\
+        --projects 20 --tasks 800 --out benchmarks/results/base.json
+    python -m benchmarks.run --url ... --baseline benchmarks/results/base.json
+"""
@@ -0,0 +1,93 @@
+import time
+import statistics
+import tracemalloc
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class _CountingCursor:
+    """Cursor do lado do servidor (rowcount = -1): conta as linhas à medida que são buscadas"""
+
+    def __init__(self, cursor, probe):
+        self._cursor = cursor
+        self._probe = probe
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None: self._probe.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._probe.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._probe.rows += len(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class Probe:
+    """Conta consultas e linhas de todos os engines do processo (inclusive os criados pelo app)"""
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+        event.listen(Engine, "after_cursor_execute", self._after)
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        self.queries += 1
+        # rowcount: linhas devolvidas (SELECT) ou afetadas (DML); -1 quando o driver não sabe,
+        # como nos cursores nomeados de stream_results: aí o resultado passa a ler por um cursor
+        # que conta o que é de fato buscado (o evento roda antes de o resultado ser montado)
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            self.rows += cursor.rowcount
+        elif context is not None and context.cursor is cursor:
+            context.cursor = _CountingCursor(cursor, self)
+
+    def close(self):
+        event.remove(Engine, "after_cursor_execute", self._after)
+
+    @contextmanager
+    def window(self):
+        """Mede consultas/linhas do bloco; o dicionário é preenchido na saída"""
+        start_q, start_r = self.queries, self.rows
+        out = {}
+        yield out
+        out["queries"] = self.queries - start_q
+        out["rows"] = self.rows - start_r
+
+
+def measure(probe, fn, repeat=5, setup=None):
+    """Executa `fn` `repeat` vezes (com `setup` antes de cada uma) e depois uma vez sob tracemalloc.
+
+    Retorna wall time (min/mediana/máx em ms), consultas e linhas da última execução
+    cronometrada e o pico de memória Python (tracemalloc) da execução extra.
+    """
+    times, stats = [], {}
+    for _ in range(repeat):
+        if setup: setup()
+        with probe.window() as stats:
+            start = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - start) * 1000)
+    if setup: setup()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "wall_ms_min": round(min(times), 3),
+        "wall_ms_median": round(statistics.median(times), 3),
+        "wall_ms_max": round(max(times), 3),
+        "queries": stats["queries"],
+        "rows": stats["rows"],
+        "peak_kib": round(peak / 1024, 1),
+    }
@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import itertools
+import subprocess
+
+import pandas as pd
+
+from benchmarks.synthetic import generate, STATUSES
+from benchmarks.probe import Probe, measure
+from services.metrics import counts_from_chunks
+
+REGRESSION_THRESHOLD = 1.25  # mediana 25% mais lenta que a referência
+VIEWS = ["dashboard", "management", "projects", "settings"]
+
+
+def _view_script():
+    # Executado pelo AppTest num script isolado: só pode usar o que importar aqui dentro
+    import streamlit as st
+    from services.data_manager import get_data_manager
+    from views.dashboard import render_dashboard
+    from views.management import render_management
+    from views.projects import render_projects
+    from views.settings import render_settings
+
+    dm = get_data_manager()
+    view = st.session_state["bench_view"]
+    if view == "dashboard": render_dashboard(dm)
+    elif view == "management": render_management(dm, st.session_state["bench_pid"], st.session_state["bench_pname"])
+    elif view == "projects": render_projects(dm)
+    elif view == "settings": render_settings(dm)
+
+
+def method_cases(dm, project_id, project_name):
+    """[(nome, fn, leitura?)] cobrindo os métodos públicos do DataManager.
+
+    As escritas são reversíveis (alternam valores) para que as repetições partam do mesmo estado.
+    """
+    toggle = itertools.cycle(STATUSES)
+    task_ids = dm.get_project_data(project_id)['task_id'].head(100).tolist()
+    admin = dm.get_all_tasks_admin()
+    sectors = dm.get_aux_list('sectors')
+    flip = itertools.cycle([" (bench)", ""])
+
+    def update_statuses():
+        status = next(toggle)
+        dm.update_statuses([(project_id, tid, status) for tid in task_ids])
+
+    def save_task_changes():
+        edited = admin.head(20).copy()
+        edited['description'] = edited['description'].astype(object).fillna('').str.replace(" (bench)", "", regex=False) + next(flip)
+        dm.save_task_changes(edited, admin)
+
+    def update_aux_list():
+        renamed = sectors.head(5).copy()
+        renamed['name'] = renamed['name'] + next(flip).upper()
+        dm.update_aux_list('sectors', renamed)
+
+    def save_and_delete_project():
+        dm.save_project("OBRA BENCH TEMP", "RESIDENCIAL")
+        projects = dm.get_projects()
+        dm.delete_project(int(projects.loc[projects['name'] == "OBRA BENCH TEMP", 'id'].iloc[0]))
+
+    return [
+        ("get_projects", dm.get_projects, True),
+        ("get_project_details", lambda: dm.get_project_details(project_id), True),
+        ("get_project_data", lambda: dm.get_project_data(project_id), True),
+        ("get_project_bundle", lambda: dm.get_project_bundle(project_id), True),
+        ("get_global_dashboard_data", dm.get_global_dashboard_data, True),
+        ("stream_global_dashboard_data+fold", lambda: counts_from_chunks(dm.stream_global_dashboard_data()), True),
+        ("get_dashboard_aggregates", dm.get_dashboard_aggregates, True),
+        ("get_pending_items", lambda: dm.get_pending_items(10), True),
+        ("get_pending_items[project]", lambda: dm.get_pending_items(10, project_name), True),
+        ("get_all_tasks_admin", dm.get_all_tasks_admin, True),
+        ("get_aux_list", lambda: dm.get_aux_list('sectors'), True),
+        ("get_projects_summary", dm.get_projects_summary, True),
+        ("get_project_progress", lambda: dm.get_project_progress(project_id), True),
+        ("get_progress_by_project", dm.get_progress_by_project, True),
+        ("get_pool_stats", dm.get_pool_stats, True),
+        ("update_single_status", lambda: dm.update_single_status(project_id, task_ids[0], next(toggle)), False),
+        ("update_statuses[100]", update_statuses, False),
+        ("save_task_changes[20]", save_task_changes, False),
+        ("update_aux_list[5]", update_aux_list, False),
+        ("save_project+delete_project", save_and_delete_project, False),
+        ("rebuild_progress_rollup", dm.rebuild_progress_rollup, False),
+    ]
+
+
+def bench_methods(dm, probe, repeat, project_id, project_name):
+    def cold():
+        dm._cache.clear()
+        with dm._delta_lock: dm._delta_states.clear()
+
+    results = {}
+    for name, fn, is_read in method_cases(dm, project_id, project_name):
+        if is_read:
+            results[f"dm.{name}"] = {"cold": measure(probe, fn, repeat, setup=cold), "warm": measure(probe, fn, repeat)}
+        else:
+            results[f"dm.{name}"] = {"write": measure(probe, fn, repeat)}
+        print(f"  dm.{name}: {_summary(results[f'dm.{name}'])}", flush=True)
+    return results
+
+
+def bench_views(config, probe, repeat, project_id, project_name, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    results = {}
+    for view in VIEWS:
+        at = AppTest.from_function(_view_script, default_timeout=timeout)
+        at.secrets["database"] = config
+        at.session_state["bench_view"] = view
+        at.session_state["bench_pid"] = project_id
+        at.session_state["bench_pname"] = project_name
+        at.run()  # primeira execução: importações, engine e DataManager
+        if at.exception:
+            results[f"view.{view}"] = {"error": str(at.exception[0].value)}
+            print(f"  view.{view}: erro {results[f'view.{view}']['error']}", flush=True)
+            continue
+        results[f"view.{view}"] = {"rerun": measure(probe, at.run, repeat)}
+        print(f"  view.{view}: {_summary(results[f'view.{view}'])}", flush=True)
+    return results
+
+
+def _summary(result):
+    parts = []
+    for mode, m in result.items():
+        if isinstance(m, dict): parts.append(f"{mode} {m['wall_ms_median']:.1f}ms q={m['queries']} rows={m['rows']} peak={m['peak_kib']}KiB")
+    return " | ".join(parts)
+
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD):
+    """Lista (caso, modo, referência ms, atual ms, razão) das medianas que pioraram além do limite"""
+    regressions = []
+    for name, modes in current["results"].items():
+        for mode, m in modes.items():
+            ref = baseline["results"].get(name, {}).get(mode)
+            if not isinstance(m, dict) or not isinstance(ref, dict) or "wall_ms_median" not in m: continue
+            ratio = m["wall_ms_median"] / max(ref["wall_ms_median"], 1e-3)
+            if ratio > threshold: regressions.append((name, mode, ref["wall_ms_median"], m["wall_ms_median"], round(ratio, 2)))
+    return regressions
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark sintético do DataManager e das telas")
+    parser.add_argument("--url", required=True, help="Postgres descartável (ex.: postgresql://localhost/onboarding_bench)")
+    parser.add_argument("--reset", action="store_true", help="apaga e recria as tabelas da aplicação antes de gerar os dados")
+    parser.add_argument("--skip-generate", action="store_true", help="usa os dados já existentes no banco")
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--tasks", type=int, default=800)
+    parser.add_argument("--phases", type=int, default=12)
+    parser.add_argument("--sectors", type=int, default=15)
+    parser.add_argument("--responsibles", type=int, default=40)
+    parser.add_argument("--fill", type=float, default=0.6, help="fração de células obra x atividade com status gravado")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--set", action="append", default=[], metavar="CHAVE=VALOR", help="opção extra de [database] (ex.: delta_sync=true)")
+    parser.add_argument("--no-views", action="store_true")
+    parser.add_argument("--view-timeout", type=float, default=60)
+    parser.add_argument("--out", help="arquivo JSON de resultados (padrão: benchmarks/results/<data>.json)")
+    parser.add_argument("--baseline", help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args(argv)
+
+    config = {"url": args.url}
+    for item in args.set:
+        key, _, value = item.partition("=")
+        try:
+            config[key] = json.loads(value)
+        except ValueError:
+            config[key] = value
+
+    sizes = None
+    if not args.skip_generate:
+        print("Gerando dados sintéticos...", flush=True)
+        sizes = generate(args.url, args.projects, args.tasks, args.phases, args.sectors, args.responsibles, args.fill, reset=args.reset)
+        print(f"  {sizes}", flush=True)
+
+    from services.data_manager import DataManager
+
+    probe = Probe()
+    try:
+        dm = DataManager(config=config)
+        projects = dm.get_projects()
+        project_id, project_name = int(projects['id'].iloc[0]), str(projects['name'].iloc[0])
+        print("DataManager:", flush=True)
+        results = bench_methods(dm, probe, args.repeat, project_id, project_name)
+        if not args.no_views:
+            print("Telas (AppTest):", flush=True)
+            results.update(bench_views(config, probe, args.repeat, project_id, project_name, args.view_timeout))
+    finally:
+        probe.close()
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "sizes": sizes,
+            "config": {k: v for k, v in config.items() if k != "url"},
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    out = args.out or os.path.join("benchmarks", "results", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Resultados em {out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f))
+        for name, mode, ref, cur, ratio in regressions:
+            print(f"REGRESSÃO {name} [{mode}]: {ref:.1f}ms -> {cur:.1f}ms ({ratio}x)")
+        if regressions: return 1
+        print("Sem regressões acima do limite.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import random
+from sqlalchemy import create_engine, text
+
+STATUSES = ['NÃO INICIADO', 'PENDENTE', 'ANDAMENTO', 'ENTRADA', 'SIM', 'NÃO SE APLICA']
+STAGES = ['GERAL', 'PRÉ-OBRA', 'EXECUÇÃO', 'PÓS-OBRA', 'PROJETOS', 'DOCUMENTAÇÃO']
+CATEGORIES = ['RESIDENCIAL', 'COMERCIAL', 'INCORPORAÇÃO']
+
+# Tabelas da aplicação + estruturas criadas pelo DataManager/change feed (removidas no --reset)
+APP_TABLES = ['project_tasks', 'project_progress_rollup', 'onboarding_table_versions', 'tasks', 'phases', 'sectors', 'responsibles', 'projects']
+
+SCHEMA_DDL = [
+    "CREATE TABLE projects (id SERIAL PRIMARY KEY, name TEXT NOT NULL, category TEXT)",
+    "CREATE TABLE phases (id SERIAL PRIMARY KEY, title TEXT NOT NULL)",
+    "CREATE TABLE sectors (id SERIAL PRIMARY KEY, name TEXT NOT NULL)",
+    "CREATE TABLE responsibles (id SERIAL PRIMARY KEY, name TEXT NOT NULL)",
+    """CREATE TABLE tasks (
+        id SERIAL PRIMARY KEY,
+        phase_id INTEGER REFERENCES phases(id),
+        item_number TEXT,
+        title TEXT,
+        description TEXT,
+        area TEXT,
+        stage TEXT,
+        sector_id INTEGER REFERENCES sectors(id),
+        default_responsible_id INTEGER REFERENCES responsibles(id)
+    )""",
+    """CREATE TABLE project_tasks (
+        project_id INTEGER REFERENCES projects(id),
+        task_id INTEGER REFERENCES tasks(id),
+        status TEXT,
+        updated_at TIMESTAMPTZ DEFAULT NOW(),
+        PRIMARY KEY (project_id, task_id)
+    )""",
+]
+
+
+def _insert(conn, table, columns, rows, chunk=5000):
+    sql = text(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(':' + c for c in columns)})")
+    for i in range(0, len(rows), chunk):
+        conn.execute(sql, [dict(zip(columns, r)) for r in rows[i:i + chunk]])
+
+
+def generate(url, projects=20, tasks=800, phases=12, sectors=15, responsibles=40, fill=0.6, seed=42, reset=False):
+    """Cria o schema da aplicação e popula N obras x M atividades.
+
+    `tasks` é o total de atividades do catálogo, distribuídas entre as fases (cada fase
+    tem um cabeçalho "N.0" mais itens "N.k"); `fill` é a fração de células obra x atividade
+    com status gravado em project_tasks. Sem `reset`, falha se as tabelas já existirem.
+    Retorna um dicionário com os tamanhos gerados.
+    """
+    rng = random.Random(seed)
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        if reset:
+            for table in APP_TABLES: conn.execute(text(f"DROP TABLE IF EXISTS {table} CASCADE"))
+        for stmt in SCHEMA_DDL: conn.execute(text(stmt))
+
+        _insert(conn, "projects", ["name", "category"], [(f"OBRA {i:03d}", rng.choice(CATEGORIES)) for i in range(1, projects + 1)])
+        _insert(conn, "phases", ["title"], [(f"FASE {i:02d}",) for i in range(1, phases + 1)])
+        _insert(conn, "sectors", ["name"], [(f"SETOR {i:02d}",) for i in range(1, sectors + 1)])
+        _insert(conn, "responsibles", ["name"], [(f"RESPONSÁVEL {i:03d}",) for i in range(1, responsibles + 1)])
+
+        task_rows = []
+        per_phase = max(tasks // phases, 1)
+        for phase in range(1, phases + 1):
+            task_rows.append((phase, f"{phase}.0", f"FASE {phase:02d}", None, None, None, None, None))
+            for k in range(1, per_phase):
+                task_rows.append((
+                    phase, f"{phase}.{k}", f"Atividade {phase}.{k}", f"Descrição da atividade {phase}.{k}",
+                    rng.choice(["OBRA", "ESCRITÓRIO", None]), rng.choice(STAGES),
+                    rng.randint(1, sectors), rng.randint(1, responsibles),
+                ))
+        _insert(conn, "tasks", ["phase_id", "item_number", "title", "description", "area", "stage", "sector_id", "default_responsible_id"], task_rows)
+
+        cells = [
+            (pid, tid, rng.choice(STATUSES))
+            for pid in range(1, projects + 1)
+            for tid in range(1, len(task_rows) + 1)
+            if rng.random() < fill
+        ]
+        _insert(conn, "project_tasks", ["project_id", "task_id", "status"], cells)
+        conn.execute(text("ANALYZE"))
+    engine.dispose()
+    return {"projects": projects, "tasks": len(task_rows), "phases": phases, "sectors": sectors,
+            "responsibles": responsibles, "project_tasks": len(cells)}
@@ -1,110 +1,36 @@
 import streamlit as st
 from streamlit_option_menu import option_menu
-from services.data_manager import DataManager
-import os
-import base64
+from services.data_manager import get_data_manager
+from services import instrumentation
+import uuid
 
 from views.dashboard import render_dashboard
 from views.management import render_management
 from views.settings import render_settings
 from views.projects import render_projects
+from utils import profiler
+from utils.styles import apply_custom_styles
+from utils.assets import asset_url, read_static, static_path
 
-def get_base64_image(image_path):
-    if not os.path.exists(image_path):
-        return None
-    with open(image_path, "rb") as img_file:
-        return base64.b64encode(img_file.read()).decode()
+# perfil por tela com [profiling] enabled = true ou ?profile=1; desligado, o wrapper só repassa
+render_dashboard = profiler.profiled("dashboard", render_dashboard)
+render_management = profiler.profiled("management", render_management)
+render_settings = profiler.profiled("settings", render_settings)
+render_projects = profiler.profiled("projects", render_projects)
 
-st.set_page_config(page_title="Onboarding", layout="wide", initial_sidebar_state="expanded", page_icon="Lavie1.png")
+st.set_page_config(page_title="Onboarding", layout="wide", initial_sidebar_state="expanded", page_icon=static_path("Lavie1.png"))
 
-st.markdown("""
-<style>
-    /* 1. SEU ESTILO PADRÃO (BACKGROUND E INPUTS) */
-    [data-testid="stAppViewContainer"] {
-        background: radial-gradient(circle at 10% 20%, #1e1e24 0%, #050505 90%);
-        background-attachment: fixed;
-    }
-
-     /* Logo Area */
-    .sidebar-logo-container {
-        text-align: center;
-        padding: 20px 0;
-        margin-bottom: 20px;
-    }
-    .sidebar-logo-text {
-        font-family: 'Inter', sans-serif;
-        font-weight: 700;
-        font-size: 1.5rem;
-        color: white;
-        letter-spacing: 2px;
-    }
-    .sidebar-logo-sub {
-        font-size: 0.7rem;
-        color: var(--primary);
-        text-transform: uppercase;
-        letter-spacing: 3px;
-    }
-            
-    /* Ajustes de Inputs para contraste (Seu código) */
-    div[data-baseweb="input"] > div, div[data-baseweb="select"] > div {
-        background-color: rgba(255, 255, 255, 0.05) !important;
-        border: 1px solid rgba(255, 255, 255, 0.1) !important;
-        color: white !important;
-    }
-    div[data-testid="stNumberInput"] input, div[data-testid="stTextInput"] input {
-        color: white !important;
-    }
-
-    /* 2. CUSTOMIZAÇÃO DA SIDEBAR PARA HARMONIZAR */
-    section[data-testid="stSidebar"] {
-        background-color: #000000; /* Preto absoluto para contraste com o radial */
-        border-right: 1px solid rgba(255,255,255,0.1);
-    }
-    
-    /* Headers */
-    h1, h2, h3 { color: #ffffff !important; font-weight: 600; letter-spacing: -0.5px; }
-    
-    /* Remove padding excessivo do topo */
-    .block-container { padding-top: 2rem; }
-
-    /* Login Style */
-    .login-container {
-        background-color: transparent; 
-        background-image: linear-gradient(160deg, #1e1e1f 0%, #0a0a0c 100%);
-        border: 1px solid rgba(255, 255, 255, 0.1);
-        padding: 40px;
-        border-radius: 10px;
-        text-align: center;
-        margin-bottom: 10px;
-    }
-    div.stButton > button {
-        background-color: #E37026 !important;
-        color: white !important;
-        border: none !important;
-        font-weight: 600 !important;
-    }
-    
-    .minha-imagem {
-        width: 160px; 
-        margin-bottom: 20px; 
-        display: block; 
-        margin-left: auto; 
-        margin-right: auto;
-    }
-</style>
-""", unsafe_allow_html=True)
+apply_custom_styles()
 
 def login_screen():
     c1, c2, c3 = st.columns([1, 1, 1])
     with c2:
         st.markdown("<div style='height: 15vh;'></div>", unsafe_allow_html=True)
         
-        logo_file = "Lavie.png" if os.path.exists("Lavie.png") else "Lavie.jpg"
-        img_b64 = get_base64_image(logo_file)
+        logo_src = asset_url("Lavie.png")
         
-        if img_b64:
-            mime_type = "image/png" if logo_file.endswith(".png") else "image/jpeg"
-            header_html = f'<img src="data:{mime_type};base64,{img_b64}" style="width: 650px; height: auto; display: block; margin: 0 auto 20px auto;">'
+        if logo_src:
+            header_html = f'<img src="{logo_src}" style="width: 650px; height: auto; display: block; margin: 0 auto 20px auto;">'
         else:
             header_html = "<h2 style='color:#E37026; margin-bottom: 10px;'>LAVIE</h2>"
 
@@ -138,10 +64,14 @@ def login_screen():
                     st.error("Erro: Secrets não configurado.")
                     
 def main():
-    dm = DataManager()
+    dm = get_data_manager()
 
     with st.sidebar:
-        st.image("Lavie.png")
+        logo_src = asset_url("Lavie.png")
+        if logo_src and logo_src.startswith("app/static/"):
+            st.markdown(f'<img src="{logo_src}" style="width: 100%;">', unsafe_allow_html=True)
+        elif read_static("Lavie.png"):
+            st.image(read_static("Lavie.png"))
         st.markdown("""
             <div class="sidebar-logo-container">
                 <div class="sidebar-logo-text">ONBOARDING</div>
@@ -166,6 +96,7 @@ def main():
                 "icon": {"font-size": "1.1rem"}
             }
         )
+        instrumentation.set_view(menu)
 
 
         selected_pid = None
@@ -219,6 +150,8 @@ def main():
     elif menu == "Configurações":
         render_settings(dm)
 
+    profiler.render_panel()
+
 if __name__ == "__main__":
     if 'logged_in' not in st.session_state:
         st.session_state['logged_in'] = False
@@ -226,4 +159,10 @@ if __name__ == "__main__":
     if not st.session_state['logged_in']:
         login_screen()
     else:
-        main()
+        session_id = st.session_state.setdefault('session_id', uuid.uuid4().hex)
+        dm = get_data_manager()
+        if instrumentation.enabled(): instrumentation.begin_rerun(session_id)
+        try:
+            main()
+        finally:
+            if instrumentation.enabled(): instrumentation.end_rerun(**dm.get_query_budget())
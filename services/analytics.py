@@ -0,0 +1,64 @@
+import logging
+import threading
+
+try:
+    import duckdb
+except ImportError:  # dependência opcional: sem ela o dashboard segue no Postgres/pandas
+    duckdb = None
+
+logger = logging.getLogger(__name__)
+
+# Mesmo resultado do GROUPING SETS de DataManager.get_dashboard_aggregates, sobre as tabelas do snapshot
+DASHBOARD_COUNTS_SQL = """
+WITH cells AS (
+    SELECT CAST(p.project_name AS VARCHAR) AS project_name, CAST(c.stage AS VARCHAR) AS stage,
+           CAST(c.sector AS VARCHAR) AS sector, CAST(c.responsible AS VARCHAR) AS responsible,
+           COALESCE(CAST(s.status AS VARCHAR), 'NÃO INICIADO') AS status
+    FROM projects p CROSS JOIN catalog c
+    LEFT JOIN statuses s ON s.project_id = p.project_id AND s.task_id = c.task_id
+)
+SELECT project_name, stage, sector, responsible, status,
+       COUNT(*) AS qty,
+       COUNT(*) FILTER (WHERE status NOT IN ('SIM', 'NÃO SE APLICA')) AS not_done,
+       GROUPING(status) AS by_responsible
+FROM cells
+GROUP BY GROUPING SETS ((project_name, stage, sector, status), (project_name, sector, responsible))
+"""
+
+
+class DuckDBAnalytics:
+    """Consultas agregadas do dashboard num DuckDB embutido sobre os arquivos Arrow do snapshot.
+
+    As tabelas do snapshot (catalog, projects, statuses) são registradas sem cópia a cada nova
+    versão; o DuckDB executa o join obra x catálogo e os agrupamentos de forma colunar e
+    paralela. O Postgres continua sendo a fonte das escritas: sem snapshot em dia, `counts()`
+    retorna None e o chamador usa o caminho normal.
+    """
+
+    def __init__(self, snapshot, threads=None):
+        self._snapshot = snapshot
+        self._lock = threading.Lock()
+        self._version = None
+        self._counts = None
+        self._con = duckdb.connect(":memory:") if duckdb else None
+        if self._con and threads: self._con.execute(f"SET threads = {int(threads)}")
+
+    @property
+    def available(self):
+        return self._con is not None
+
+    def counts(self):
+        """DataFrame com as colunas do GROUPING SETS (by_responsible separa os dois níveis) ou None"""
+        if not self.available: return None
+        fresh = self._snapshot.current()
+        if fresh is None: return None
+        version, meta = fresh
+        with self._lock:
+            if version != self._version:
+                for name, table in self._snapshot.tables(meta).items(): self._con.register(name, table)
+                self._counts = self._con.execute(DASHBOARD_COUNTS_SQL).df()
+                self._version = version
+            return self._counts.copy()
+
+    def close(self):
+        if self._con: self._con.close()
@@ -0,0 +1,145 @@
+import sys
+import time
+import uuid
+import select
+import logging
+import threading
+from sqlalchemy import create_engine, text
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "onboarding_changes"
+WATCHED_TABLES = ["project_tasks", "tasks", "phases", "projects", "sectors", "responsibles"]
+
+# Identifica o processo de origem para ignorar as próprias notificações; PIDs se repetem entre
+# hosts/contêineres, então vale um uuid por processo (application_name aceita até 63 caracteres)
+ORIGIN = f"onboarding-{uuid.uuid4().hex}"
+
+# Triggers por comando: incrementam a versão da tabela (fallback por polling) e notificam
+# "origem|tabela|project_ids" no commit; para project_tasks os ids vêm das transition tables.
+# Os triggers só são criados se ainda não existirem (nada de DROP/CREATE a cada processo).
+CHANGE_FEED_DDL = [
+    """CREATE TABLE IF NOT EXISTS onboarding_table_versions (
+        table_name TEXT PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0
+    )""",
+    f"""CREATE OR REPLACE FUNCTION onboarding_notify_change() RETURNS trigger LANGUAGE plpgsql AS $$
+    DECLARE
+        ids TEXT := '';
+    BEGIN
+        INSERT INTO onboarding_table_versions AS v (table_name, version) VALUES (TG_TABLE_NAME, 1)
+        ON CONFLICT (table_name) DO UPDATE SET version = v.version + 1;
+        IF TG_TABLE_NAME = 'project_tasks' THEN
+            SELECT COALESCE(string_agg(DISTINCT project_id::TEXT, ','), '') INTO ids FROM changed_rows;
+            IF length(ids) > 7000 THEN ids := ''; END IF;
+        END IF;
+        PERFORM pg_notify('{CHANNEL}', COALESCE(current_setting('application_name', true), '') || '|' || TG_TABLE_NAME || '|' || ids);
+        RETURN NULL;
+    END $$""",
+    f"""DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'onboarding_change_ins' AND tgrelid = 'project_tasks'::regclass) THEN
+            CREATE TRIGGER onboarding_change_ins AFTER INSERT ON project_tasks REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION onboarding_notify_change();
+            CREATE TRIGGER onboarding_change_upd AFTER UPDATE ON project_tasks REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION onboarding_notify_change();
+            CREATE TRIGGER onboarding_change_del AFTER DELETE ON project_tasks REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION onboarding_notify_change();
+        END IF;
+        {chr(10).join(
+            f"IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'onboarding_change' AND tgrelid = '{table}'::regclass) THEN"
+            f" CREATE TRIGGER onboarding_change AFTER INSERT OR UPDATE OR DELETE ON {table}"
+            " FOR EACH STATEMENT EXECUTE FUNCTION onboarding_notify_change(); END IF;"
+            for table in WATCHED_TABLES[1:]
+        )}
+    END $$""",
+]
+
+
+def parse_payload(payload):
+    """'origem|tabela|1,2' -> (origem, tabela, [1, 2] ou None)"""
+    origin, table, ids = (payload.split("|") + ["", ""])[:3]
+    project_ids = [int(i) for i in ids.split(",") if i] or None
+    return origin, table, project_ids
+
+
+class ChangeFeed:
+    """Escuta LISTEN/NOTIFY numa conexão dedicada e chama `on_change(table, project_ids)`.
+
+    Se o LISTEN cair, passa a consultar onboarding_table_versions a cada `poll_interval`
+    segundos até conseguir assinar de novo; a cada (re)assinatura a tabela de versões é
+    conferida para cobrir notificações perdidas durante a queda.
+    """
+
+    def __init__(self, engine, on_change, poll_interval=5.0, ignore_origin=ORIGIN):
+        self._engine = engine
+        self._on_change = on_change
+        self._poll_interval = poll_interval
+        self._ignore_origin = ignore_origin
+        self._versions = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread: self._thread.join(timeout=self._poll_interval + 1)
+
+    def poll_versions(self):
+        """Compara a tabela de versões com a última leitura e notifica as tabelas alteradas"""
+        with self._engine.connect() as conn:
+            current = dict(conn.execute(text("SELECT table_name, version FROM onboarding_table_versions")).fetchall())
+        previous, self._versions = self._versions, current
+        if previous is None: return []
+        changed = [t for t, v in current.items() if previous.get(t) != v]
+        for table in changed: self._on_change(table, None)
+        return changed
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                logger.warning("LISTEN indisponível, usando polling: %s", e)
+                self._poll_until_retry()
+
+    def _poll_until_retry(self, retry_after=60.0):
+        deadline = time.monotonic() + retry_after
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            try:
+                self.poll_versions()
+            except Exception as e:
+                logger.warning("Falha ao consultar versões: %s", e)
+            self._stop.wait(self._poll_interval)
+
+    def _listen(self):
+        raw = self._engine.raw_connection()
+        raw.detach()  # conexão dedicada, fora do pool
+        dbapi = getattr(raw, "driver_connection", None) or raw.connection
+        try:
+            dbapi.autocommit = True
+            dbapi.cursor().execute(f"LISTEN {CHANNEL}")
+            self.poll_versions()
+            while not self._stop.is_set():
+                if select.select([dbapi], [], [], self._poll_interval) == ([], [], []): continue
+                dbapi.poll()
+                while dbapi.notifies:
+                    note = dbapi.notifies.pop(0)
+                    origin, table, project_ids = parse_payload(note.payload)
+                    if origin != self._ignore_origin: self._on_change(table, project_ids)
+        finally:
+            raw.close()
+
+
+if __name__ == "__main__":
+    # Teste manual contra um Postgres local: python -m services.change_feed postgresql://...
+    engine = create_engine(sys.argv[1], connect_args={"application_name": "change-feed-cli"})
+    with engine.begin() as conn:
+        for stmt in CHANGE_FEED_DDL: conn.execute(text(stmt))
+    feed = ChangeFeed(engine, lambda table, ids: print(f"{table} {ids or ''}", flush=True), ignore_origin=None).start()
+    print(f"Escutando '{CHANNEL}'... (Ctrl+C para sair)")
+    try:
+        while True: time.sleep(1)
+    except KeyboardInterrupt:
+        feed.stop()
@@ -1,29 +1,596 @@
+import time
+import threading
+import functools
+import logging
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
 import pandas as pd
 import streamlit as st
 from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DataError, IntegrityError
+from services.status_journal import StatusJournal
+from services.snapshot import DashboardSnapshot
+from services.analytics import DuckDBAnalytics
+from services.metrics import counts_from_matrix, normalize_status
+from services.change_feed import ChangeFeed, CHANGE_FEED_DDL, ORIGIN
+from services import instrumentation
+
+POOL_DEFAULTS = {"pool_size": 5, "max_overflow": 10, "pool_recycle": 1800, "pool_timeout": 30, "pool_pre_ping": True}
+
+CACHE_DEFAULTS = {"cache_ttl": 300, "cache_max_entries": 256}
+
+logger = logging.getLogger(__name__)
+
+DONE_STATUSES = ('SIM', 'NÃO SE APLICA')
+
+# Normalização de status equivalente à aplicada no dashboard (CONCLUIDO/OK -> SIM etc.)
+STATUS_SQL = """CASE UPPER(TRIM(COALESCE({col}, 'NÃO INICIADO')))
+        WHEN 'NAO SE APLICA' THEN 'NÃO SE APLICA' WHEN 'NAO INICIADO' THEN 'NÃO INICIADO'
+        WHEN 'CONCLUIDO' THEN 'SIM' WHEN 'OK' THEN 'SIM'
+        ELSE UPPER(TRIM(COALESCE({col}, 'NÃO INICIADO'))) END"""
+
+# "Item real": item_number contém ponto e não termina em .0 (exclui cabeçalhos de fase)
+REAL_ITEM_SQL = "(STRPOS(TRIM({col}), '.') > 0 AND TRIM({col}) NOT LIKE '%.0')"
+
+TASK_EDIT_COLUMNS = ['description', 'area', 'stage', 'sector_name', 'resp_name']
+BATCH_SIZE = 1000
+STREAM_CHUNK_ROWS = 50000
+
+# Folga da marca d'água do delta sync: updated_at é o NOW() do início da transação, então uma
+# escrita confirmada depois da última leitura pode ter updated_at anterior à marca
+DELTA_WATERMARK_LAG_SECONDS = 30
+
+# Leituras cujo primeiro argumento é o project_id (invalidação precisa pelo change feed)
+PROJECT_SCOPED_READS = ("_fetch_project_data", "get_project_progress", "_fetch_project_bundle")
+
+# Colunas do frame de atividades de uma obra (get_project_data / get_project_bundle)
+PROJECT_DATA_COLUMNS = ['phase_title', 'task_id', 'item_number', 'item_root', 'title', 'description', 'area', 'stage', 'sector', 'responsible', 'status']
+
+DASHBOARD_TABLES = ("projects", "tasks", "phases", "sectors", "responsibles", "project_tasks")
+PROGRESS_TABLES = ("projects", "tasks", "project_tasks")
+
+# Chave de ordenação de item_number calculada na escrita (trigger) e indexada.
+# Segmentos numéricos com mais de 9 dígitos viram NULL (ordenam por último) em vez de estourar o INTEGER.
+# As alterações em `tasks` (colunas, backfill, trigger, índice) só rodam quando faltam: ALTER/CREATE
+# TRIGGER pegam lock exclusivo na tabela e bloqueariam as leituras a cada inicialização de servidor.
+SORT_KEY_DDL = [
+    """CREATE OR REPLACE FUNCTION onboarding_item_path(item TEXT) RETURNS INTEGER[] LANGUAGE sql IMMUTABLE AS $$
+        SELECT array_agg(substring(regexp_replace(part, '[^0-9]', '', 'g') from '^0*([0-9]{1,9})$')::INTEGER ORDER BY pos)
+        FROM unnest(string_to_array(TRIM(item), '.')) WITH ORDINALITY AS p(part, pos)
+    $$""",
+    """CREATE OR REPLACE FUNCTION onboarding_tasks_sort_key() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.item_path := onboarding_item_path(NEW.item_number);
+        NEW.item_root := NEW.item_path[1];
+        RETURN NEW;
+    END $$""",
+    """DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = 'tasks' AND column_name = 'item_path') THEN
+            ALTER TABLE tasks ADD COLUMN IF NOT EXISTS item_root INTEGER, ADD COLUMN item_path INTEGER[];
+            UPDATE tasks SET item_path = onboarding_item_path(item_number), item_root = (onboarding_item_path(item_number))[1] WHERE item_number IS NOT NULL;
+        END IF;
+        IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgrelid = 'tasks'::regclass AND tgname = 'tasks_sort_key') THEN
+            CREATE TRIGGER tasks_sort_key BEFORE INSERT OR UPDATE OF item_number ON tasks FOR EACH ROW EXECUTE FUNCTION onboarding_tasks_sort_key();
+        END IF;
+        IF to_regclass('tasks_item_sort_idx') IS NULL THEN
+            CREATE INDEX tasks_item_sort_idx ON tasks (item_root, item_path);
+        END IF;
+    END $$""",
+]
+
+# Rollup de progresso (sector_id 0 = sem setor) mantido por triggers no próprio banco, então
+# escritas de outras ferramentas e mudanças no catálogo também entram. Status: delta por comando
+# (células sem linha contam como NÃO INICIADO, só done/pending mudam). Catálogo e obras: as
+# fases/obras tocadas são recalculadas por inteiro, independente da ordem dos triggers em cascata.
+ROLLUP_DONE_SQL = f"CASE WHEN {STATUS_SQL.format(col='status')} IN ('SIM', 'NÃO SE APLICA') THEN 1 ELSE 0 END"
+
+ROLLUP_STATUS_DELTA_SQL = f"""
+        INSERT INTO project_progress_rollup AS r (project_id, phase_id, stage, sector_id, real_item, total, done, pending)
+        SELECT d.project_id, t.phase_id, COALESCE(t.stage, 'GERAL'), COALESCE(t.sector_id, 0), {REAL_ITEM_SQL.format(col="t.item_number")},
+               0, SUM(d.delta), -SUM(d.delta)
+        FROM ({{source}}) d
+        JOIN tasks t ON t.id = d.task_id
+        JOIN phases ph ON ph.id = t.phase_id
+        JOIN projects pr ON pr.id = d.project_id
+        GROUP BY 1, 2, 3, 4, 5
+        HAVING SUM(d.delta) <> 0
+        ORDER BY 1, 2, 3, 4, 5
+        ON CONFLICT (project_id, phase_id, stage, sector_id, real_item) DO UPDATE
+        SET done = r.done + EXCLUDED.done, pending = r.pending + EXCLUDED.pending"""
+
+ROLLUP_DDL = [
+    """CREATE TABLE IF NOT EXISTS project_progress_rollup (
+        project_id INTEGER NOT NULL,
+        phase_id INTEGER NOT NULL,
+        stage TEXT NOT NULL,
+        sector_id INTEGER NOT NULL,
+        real_item BOOLEAN NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        done INTEGER NOT NULL DEFAULT 0,
+        pending INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (project_id, phase_id, stage, sector_id, real_item)
+    )""",
+    f"""CREATE OR REPLACE FUNCTION onboarding_rollup_refresh(project_ids INTEGER[], phase_ids INTEGER[]) RETURNS void LANGUAGE plpgsql AS $$
+    BEGIN
+        -- espera os deltas de status em andamento: o recálculo abaixo já os enxerga confirmados
+        LOCK TABLE project_progress_rollup IN SHARE ROW EXCLUSIVE MODE;
+        DELETE FROM project_progress_rollup
+        WHERE (project_ids IS NULL OR project_id = ANY(project_ids)) AND (phase_ids IS NULL OR phase_id = ANY(phase_ids));
+        INSERT INTO project_progress_rollup (project_id, phase_id, stage, sector_id, real_item, total, done, pending)
+        SELECT pr.id, t.phase_id, COALESCE(t.stage, 'GERAL'), COALESCE(t.sector_id, 0), {REAL_ITEM_SQL.format(col="t.item_number")},
+               COUNT(*),
+               COUNT(*) FILTER (WHERE {STATUS_SQL.format(col="pt.status")} IN ('SIM', 'NÃO SE APLICA')),
+               COUNT(*) FILTER (WHERE {STATUS_SQL.format(col="pt.status")} NOT IN ('SIM', 'NÃO SE APLICA'))
+        FROM projects pr CROSS JOIN tasks t
+        JOIN phases ph ON t.phase_id = ph.id
+        LEFT JOIN project_tasks pt ON pt.task_id = t.id AND pt.project_id = pr.id
+        WHERE (project_ids IS NULL OR pr.id = ANY(project_ids)) AND (phase_ids IS NULL OR t.phase_id = ANY(phase_ids))
+        GROUP BY 1, 2, 3, 4, 5;
+    END $$""",
+    f"""CREATE OR REPLACE FUNCTION onboarding_rollup_status() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN{ROLLUP_STATUS_DELTA_SQL.format(source=f"SELECT project_id, task_id, {ROLLUP_DONE_SQL} AS delta FROM new_rows")};
+        ELSIF TG_OP = 'DELETE' THEN{ROLLUP_STATUS_DELTA_SQL.format(source=f"SELECT project_id, task_id, -{ROLLUP_DONE_SQL} AS delta FROM old_rows")};
+        ELSE{ROLLUP_STATUS_DELTA_SQL.format(source=f"SELECT project_id, task_id, {ROLLUP_DONE_SQL} AS delta FROM new_rows UNION ALL SELECT project_id, task_id, -{ROLLUP_DONE_SQL} FROM old_rows")};
+        END IF;
+        RETURN NULL;
+    END $$""",
+    """CREATE OR REPLACE FUNCTION onboarding_rollup_catalog() RETURNS trigger LANGUAGE plpgsql AS $$
+    DECLARE
+        ids INTEGER[];
+    BEGIN
+        IF TG_TABLE_NAME = 'projects' THEN
+            IF TG_OP = 'INSERT' THEN SELECT array_agg(id) INTO ids FROM new_rows;
+            ELSE SELECT array_agg(id) INTO ids FROM old_rows; END IF;
+            IF ids IS NOT NULL THEN PERFORM onboarding_rollup_refresh(ids, NULL); END IF;
+            RETURN NULL;
+        END IF;
+        IF TG_TABLE_NAME = 'phases' THEN SELECT array_agg(id) INTO ids FROM old_rows;
+        ELSIF TG_OP = 'INSERT' THEN SELECT array_agg(DISTINCT phase_id) INTO ids FROM new_rows;
+        ELSIF TG_OP = 'DELETE' THEN SELECT array_agg(DISTINCT phase_id) INTO ids FROM old_rows;
+        ELSE
+            -- só mudanças que afetam o rollup (fase, etapa, setor, item real); fase de origem e de destino
+            SELECT array_agg(DISTINCT x.phase_id) INTO ids FROM (
+                SELECT o.phase_id FROM old_rows o JOIN new_rows n ON n.id = o.id
+                WHERE (o.phase_id, o.stage, o.sector_id, o.item_number) IS DISTINCT FROM (n.phase_id, n.stage, n.sector_id, n.item_number)
+                UNION
+                SELECT n.phase_id FROM old_rows o JOIN new_rows n ON n.id = o.id
+                WHERE (o.phase_id, o.stage, o.sector_id, o.item_number) IS DISTINCT FROM (n.phase_id, n.stage, n.sector_id, n.item_number)
+            ) x WHERE x.phase_id IS NOT NULL;
+        END IF;
+        IF ids IS NOT NULL THEN PERFORM onboarding_rollup_refresh(NULL, ids); END IF;
+        RETURN NULL;
+    END $$""",
+    # triggers criados uma única vez (sem lock nas tabelas quando já existem); ao criá-los o rollup
+    # é recalculado, corrigindo qualquer divergência de antes deles
+    """DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgrelid = 'project_tasks'::regclass AND tgname = 'onboarding_rollup_ins') THEN
+            CREATE TRIGGER onboarding_rollup_ins AFTER INSERT ON project_tasks REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION onboarding_rollup_status();
+            CREATE TRIGGER onboarding_rollup_upd AFTER UPDATE ON project_tasks REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION onboarding_rollup_status();
+            CREATE TRIGGER onboarding_rollup_del AFTER DELETE ON project_tasks REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION onboarding_rollup_status();
+            CREATE TRIGGER onboarding_rollup_ins AFTER INSERT ON tasks REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION onboarding_rollup_catalog();
+            CREATE TRIGGER onboarding_rollup_upd AFTER UPDATE ON tasks REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION onboarding_rollup_catalog();
+            CREATE TRIGGER onboarding_rollup_del AFTER DELETE ON tasks REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION onboarding_rollup_catalog();
+            CREATE TRIGGER onboarding_rollup_del AFTER DELETE ON phases REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION onboarding_rollup_catalog();
+            CREATE TRIGGER onboarding_rollup_ins AFTER INSERT ON projects REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION onboarding_rollup_catalog();
+            CREATE TRIGGER onboarding_rollup_del AFTER DELETE ON projects REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION onboarding_rollup_catalog();
+            PERFORM onboarding_rollup_refresh(NULL, NULL);
+        END IF;
+    END $$""",
+]
+
+# Produto obras x atividades (uma linha por célula), lido em blocos
+GLOBAL_DASHBOARD_SQL = """
+SELECT pr.name as project_name, ph.title as phase_title, t.item_number, t.stage, s.name as sector, r.name as responsible, COALESCE(pt.status, 'NÃO INICIADO') as status
+FROM tasks t CROSS JOIN projects pr JOIN phases ph ON t.phase_id = ph.id
+LEFT JOIN project_tasks pt ON t.id = pt.task_id AND pt.project_id = pr.id
+LEFT JOIN sectors s ON t.sector_id = s.id LEFT JOIN responsibles r ON t.default_responsible_id = r.id
+"""
+
+_wait_lock = threading.Lock()
+_wait_stats = {"checkouts": 0, "wait_total": 0.0, "wait_max": 0.0}
+
+@st.cache_resource(show_spinner=False)
+def _shared_engine(db_url, pool_size, max_overflow, pool_recycle, pool_timeout, pool_pre_ping):
+    """Um único engine (e pool) por processo, compartilhado entre sessões e reruns"""
+    return create_engine(
+        db_url,
+        connect_args={"application_name": ORIGIN},
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_recycle=pool_recycle,
+        pool_timeout=pool_timeout,
+        pool_pre_ping=pool_pre_ping,
+    )
+
+class QueryCache:
+    """Cache LRU com TTL para leituras; invalidado por contadores de versão por tabela"""
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def versions(self, tables):
+        with self._lock:
+            return tuple(self._versions.get(t, 0) for t in tables)
+
+    def bump(self, *tables, patch=None):
+        """Invalida as entradas que dependem de `tables`.
+
+        Com `patch(key, value)`, as entradas em dia podem ser atualizadas em vez de descartadas:
+        o valor devolvido (None descarta) é regravado sob as versões novas, atomicamente.
+        """
+        with self._lock:
+            before = dict(self._versions)
+            for t in tables:
+                self._versions[t] = self._versions.get(t, 0) + 1
+            stale = [k for k, (_, _, deps) in self._entries.items() if set(deps) & set(tables)]
+            for k in stale:
+                value, expires, deps = self._entries.pop(k)
+                if patch is None or k[-1] != tuple(before.get(t, 0) for t in deps): continue
+                value = patch(k, value)
+                if value is not None:
+                    self._entries[k[:-1] + (tuple(self._versions.get(t, 0) for t in deps),)] = (value, expires, deps)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None: return False, None
+            value, expires, _ = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def put(self, key, value, tables):
+        if self.ttl <= 0 or self._max_entries <= 0: return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl, tables)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def load(self, key, loader):
+        """Executa `loader` uma única vez por chave em andamento; chamadas concorrentes esperam o resultado"""
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner: future = self._inflight[key] = Future()
+        if not owner: return future.result()
+        try:
+            value = loader()
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock: self._inflight.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def _cached(*tables):
+    """Leitura com cache: chave = (método, argumentos, versões das tabelas consultadas)"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            key = (fn.__name__, args, tuple(sorted(kwargs.items())), self._cache.versions(tables))
+            hit, value = self._cache.get(key)
+            if not hit:
+                value = self._cache.load(key, lambda: fn(self, *args, **kwargs))
+                if value is None or not self._engine: return value
+                self._cache.put(key, value, tables)
+            return _copy_value(value)
+        return wrapper
+    return decorator
+
+def _copy_value(value):
+    """Cópia entregue ao chamador: dicionários de frames são copiados item a item"""
+    if isinstance(value, dict): return {k: _copy_value(v) for k, v in value.items()}
+    return value.copy() if hasattr(value, "copy") else value
+
+def _apply_statuses(df, statuses):
+    """Aplica {task_id: status} no frame (in place), ampliando o dicionário de categorias se preciso"""
+    df['status'] = df['status'].astype(CATEGORIES.dtype('status', list(statuses.values())))
+    mask = df['task_id'].isin(list(statuses))
+    df.loc[mask, 'status'] = df.loc[mask, 'task_id'].map(statuses)
+    return df
+
+def _bundle_counters(tasks):
+    """Contadores por fase e geral de get_project_bundle recalculados sobre o frame de atividades"""
+    is_done = normalize_status(tasks['status'].astype(object)).isin(DONE_STATUSES)
+    phases = tasks.assign(done=is_done).groupby('item_root', dropna=False, sort=False).agg(total=('task_id', 'size'), done=('done', 'sum')).reset_index()
+    done = int(is_done.sum())
+    return {"phases": phases, "progress": {"total": len(tasks), "done": done, "pending": len(tasks) - done}}
+
+def _patch_bundle_statuses(latest, key, bundle):
+    """Aplica status recém-gravados ({(project_id, task_id): status}) num bundle em cache, sem nova leitura.
+
+    Entradas de outros métodos são descartadas (None); bundles de outras obras seguem como estão.
+    """
+    if key[0] != "_fetch_project_bundle" or not key[1] or bundle is None: return None
+    latest = {tid: status for (pid, tid), status in latest.items() if pid == int(key[1][0])}
+    if not latest: return bundle
+    tasks = _apply_statuses(bundle["tasks"].copy(), latest)
+    return dict(bundle, tasks=tasks, **_bundle_counters(tasks))
+
+def _max_timestamp(values):
+    values = [v for v in values if v is not None]
+    return max(values) if values else None
+
+def _changed_rows(df_edited, df_original, columns):
+    """Linhas de df_edited (por id) cujas colunas diferem de df_original; None e '' são equivalentes"""
+    if df_original is None or df_edited.empty: return df_edited
+    def norm(df):
+        return df.set_index('id')[columns].astype(object).fillna('').astype(str).apply(lambda c: c.str.strip())
+    new = norm(df_edited)
+    old = norm(df_original).reindex(new.index)
+    diff = (new != old).any(axis=1) | old.isna().any(axis=1)
+    return df_edited[df_edited['id'].isin(diff[diff].index)]
+
+class CategoryRegistry:
+    """Dicionários de categorias por coluna lógica, compartilhados no processo e só crescentes.
+
+    Como as categorias nunca são removidas nem reordenadas, o código inteiro de um valor é
+    estável entre frames e entradas de cache (status vira um int8).
+    """
+    def __init__(self, seeds):
+        self._categories = {name: list(values) for name, values in seeds.items()}
+        self._dtypes = {name: pd.CategoricalDtype(values) for name, values in self._categories.items()}
+        self._lock = threading.Lock()
+
+    def dtype(self, name, values=()):
+        with self._lock:
+            known = self._categories.setdefault(name, [])
+            seen = set(known)
+            new = [v for v in pd.unique(pd.Series(values, dtype=object).dropna()) if v not in seen]
+            if new or name not in self._dtypes:
+                known.extend(new)
+                self._dtypes[name] = pd.CategoricalDtype(list(known))
+            return self._dtypes[name]
+
+    def encode(self, df):
+        """Converte as colunas conhecidas do frame (in place) para os dtypes compartilhados"""
+        for col, name in CATEGORY_COLUMNS.items():
+            if col in df.columns:
+                df[col] = df[col].astype(self.dtype(name, df[col].astype(object).unique()))
+        return df
+
+CATEGORY_COLUMNS = {
+    'status': 'status', 'sector': 'sector', 'sector_name': 'sector', 'responsible': 'responsible',
+    'resp_name': 'responsible', 'stage': 'stage', 'phase_title': 'phase_title', 'project_name': 'project_name',
+}
+
+CATEGORIES = CategoryRegistry({
+    'status': ['NÃO INICIADO', 'PENDENTE', 'ANDAMENTO', 'ENTRADA', 'SIM', 'NÃO SE APLICA'],
+    'stage': ['GERAL', 'PRÉ-OBRA', 'EXECUÇÃO', 'PÓS-OBRA', 'PROJETOS', 'DOCUMENTAÇÃO'],
+})
+
+@st.cache_resource(show_spinner=False)
+def get_data_manager():
+    return DataManager()
 
 class DataManager:
-    def __init__(self):
-        self._db_url = st.secrets["database"]["url"]
+    def __init__(self, config=None):
+        self._config = dict(config if config is not None else st.secrets["database"])
+        self._db_url = self._config["url"]
         self._engine = None
+        self._cache = QueryCache(
+            float(self._config.get("cache_ttl", CACHE_DEFAULTS["cache_ttl"])),
+            int(self._config.get("cache_max_entries", CACHE_DEFAULTS["cache_max_entries"])),
+        )
+        self._rollup_ready = False
+        self._sort_key_ready = False
+        self._journal = None
+        self._snapshot = None
+        self._delta_sync = bool(self._config.get("delta_sync", False))
+        self._delta_lag = float(self._config.get("delta_sync_lag", DELTA_WATERMARK_LAG_SECONDS))
+        self._delta_states = {}
+        self._delta_locks = {}
+        self._delta_lock = threading.Lock()  # só protege os dicionários; cada obra sincroniza sob o próprio lock
+        self._executor = None
+        self._executor_lock = threading.Lock()
         self._init_connection()
+        if self._engine and self.instrumentation_enabled():
+            instrumentation.instrument(self._engine, __file__, self._config.get("query_log"))
+        self._ensure_schema()
+        if self._engine and self._config.get("snapshot_dir"):
+            self._snapshot = DashboardSnapshot(self._config["snapshot_dir"], self._build_snapshot, self._snapshot_version)
+            if not self._snapshot.available: self._snapshot = None
+        self._analytics = None
+        if self._snapshot and self._config.get("analytics") == "duckdb":
+            self._analytics = DuckDBAnalytics(self._snapshot, self._config.get("analytics_threads"))
+            if not self._analytics.available:
+                logger.warning("analytics = 'duckdb' configurado, mas o pacote duckdb não está instalado")
+                self._analytics = None
+        self._feed = None
+        if self._engine and self._config.get("change_feed"):
+            if self._run_ddl("Change feed", CHANGE_FEED_DDL):
+                self._feed = ChangeFeed(
+                    self._engine, self._on_remote_change,
+                    poll_interval=float(self._config.get("change_feed_poll_interval", 5.0)),
+                ).start()
+            else:
+                logger.error("change_feed configurado, mas os triggers não puderam ser criados: "
+                             "mudanças de outros processos só aparecem após o cache_ttl")
+        if self._engine and self._config.get("status_journal"):
+            self._journal = StatusJournal(
+                self._config["status_journal"], self.update_statuses,
+                interval=float(self._config.get("status_journal_interval", 1.0)),
+                permanent_errors=(IntegrityError, DataError),
+            )
 
     def _init_connection(self):
+        opts = {k: self._config.get(k, v) for k, v in POOL_DEFAULTS.items()}
         try:
-            self._engine = create_engine(self._db_url, pool_pre_ping=True)
+            self._engine = _shared_engine(self._db_url, **opts)
         except Exception as e:
             st.error(f"Erro de conexão: {e}")
 
+    def _on_remote_change(self, table, project_ids=None):
+        """Mudança feita por outro processo: invalida só o que depende dela"""
+        if table == "project_tasks" and project_ids:
+            ids = set(project_ids)
+            # a versão sobe (caches da UI chaveados por data_version também renovam); as leituras
+            # de outras obras são regravadas sob a versão nova em vez de descartadas
+            self._cache.bump(table, patch=lambda key, value: value if key[0] in PROJECT_SCOPED_READS and key[1][:1] and key[1][0] not in ids else None)
+            with self._delta_lock:
+                for pid in ids:
+                    if pid in self._delta_states: self._delta_states[pid]["synced_at"] = float("-inf")
+        else:
+            self._cache.bump(table)
+
+    def _ensure_schema(self):
+        """Cria as estruturas auxiliares; sem permissão de DDL, cada uma cai no cálculo direto"""
+        if not self._engine: return
+        self._sort_key_ready = self._run_ddl("Chave de ordenação", SORT_KEY_DDL)
+        self._rollup_ready = self._run_ddl("Rollup de progresso", ROLLUP_DDL)
+        for table in ['sectors', 'responsibles']:
+            self._run_ddl(f"Índice único de {table}", [f"CREATE UNIQUE INDEX IF NOT EXISTS {table}_name_key ON {table} (name)"])
+
+    def _run_ddl(self, label, statements):
+        """Executa o DDL numa transação; o advisory lock serializa processos subindo juntos
+        (CREATE OR REPLACE concorrente falha com "tuple concurrently updated")"""
+        try:
+            with self._connect(begin=True) as conn:
+                conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('onboarding_ddl'))"))
+                for stmt in statements: conn.execute(text(stmt))
+            return True
+        except Exception as e:
+            logger.warning("%s indisponível: %s", label, e)
+            return False
+
+    def _item_order(self, alias="t"):
+        """ORDER BY hierárquico: usa as colunas persistidas quando disponíveis"""
+        if self._sort_key_ready: return f"{alias}.item_root NULLS LAST, {alias}.item_path NULLS LAST, {alias}.id"
+        return f"NULLIF(regexp_replace({alias}.item_number, '[^0-9.]', '', 'g'), '')::numeric"
+
+    def _item_root(self, alias="t"):
+        if self._sort_key_ready: return f"{alias}.item_root"
+        return f"substring(regexp_replace(split_part({alias}.item_number, '.', 1), '[^0-9]', '', 'g') from '^0*([0-9]{{1,9}})$')::INTEGER"
+
+    def rebuild_progress_rollup(self):
+        """Recalcula o rollup inteiro a partir de project_tasks (os triggers o mantêm; uso pontual)"""
+        if not self._engine or not self._rollup_ready: return False
+        with self._connect(begin=True) as conn:
+            conn.execute(text("SELECT onboarding_rollup_refresh(NULL, NULL)"))
+        self._cache.bump("project_tasks")
+        return True
+
+    @contextmanager
+    def _connect(self, begin=False):
+        """Checkout do pool medindo o tempo de espera por uma conexão livre"""
+        start = time.perf_counter()
+        with (self._engine.begin() if begin else self._engine.connect()) as conn:
+            waited = time.perf_counter() - start
+            with _wait_lock:
+                _wait_stats["checkouts"] += 1
+                _wait_stats["wait_total"] += waited
+                _wait_stats["wait_max"] = max(_wait_stats["wait_max"], waited)
+            yield conn
+
+    def fetch_many(self, requests):
+        """Executa leituras independentes em paralelo, cada uma com sua conexão do pool.
+
+        `requests` é {nome: (método, *args)}; pedidos idênticos rodam uma vez só e o resultado
+        é repartido. Retorna {nome: resultado}, então a latência fica a da leitura mais lenta.
+        """
+        unique = {}
+        for name, (method, *args) in requests.items():
+            unique.setdefault((method, tuple(args)), []).append(name)
+        if len(unique) <= 1 or not self._engine:
+            done = {call: getattr(self, call[0])(*call[1]) for call in unique}
+        else:
+            executor = self._fetch_executor()
+            # copia os contextvars (rerun da instrumentação) para as threads
+            futures = {call: executor.submit(contextvars.copy_context().run, getattr(self, call[0]), *call[1]) for call in unique}
+            done = {call: future.result() for call, future in futures.items()}
+        results = {}
+        for call, names in unique.items():
+            value = done[call]
+            for i, name in enumerate(names):
+                results[name] = value.copy() if i and hasattr(value, "copy") else value
+        return results
+
+    def _fetch_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                workers = int(self._config.get("pool_size", POOL_DEFAULTS["pool_size"]))
+                self._executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="dm-fetch")
+            return self._executor
+
+    def _stream(self, query, params=None, chunksize=STREAM_CHUNK_ROWS):
+        """Lê em blocos por cursor do lado do servidor; gera DataFrames já com as categorias"""
+        with self._connect() as conn:
+            conn = conn.execution_options(stream_results=True, max_row_buffer=chunksize)
+            for chunk in pd.read_sql(query, conn, params=params, chunksize=chunksize):
+                yield CATEGORIES.encode(chunk)
+
+    def get_pool_stats(self):
+        """Estatísticas do pool para dimensionamento (em uso, overflow, espera)"""
+        if not self._engine: return {}
+        pool = self._engine.pool
+        with _wait_lock:
+            waits = dict(_wait_stats)
+        n = waits["checkouts"]
+        return {
+            "pool_size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": self._config.get("max_overflow", POOL_DEFAULTS["max_overflow"]),
+            "checkouts": n,
+            "wait_avg_ms": round(waits["wait_total"] / n * 1000, 2) if n else 0.0,
+            "wait_max_ms": round(waits["wait_max"] * 1000, 2),
+        }
+
+    def diagnostics_enabled(self):
+        return bool(self._config.get("diagnostics"))
+
+    def instrumentation_enabled(self):
+        """Hooks de consultas só com diagnóstico, log de consultas ou orçamento configurados"""
+        return bool(self.diagnostics_enabled() or self._config.get("query_log")
+                    or self._config.get("query_budget") or self._config.get("query_budget_ms"))
+
+    def data_version(self, *tables):
+        """Versão atual dos dados das tabelas (muda a cada escrita/invalidação); serve de chave a caches da UI.
+
+        Com snapshot, inclui a geração publicada: as contagens do snapshot/DuckDB mudam quando
+        uma reconstrução termina, sem passar pelos contadores de versão.
+        """
+        versions = self._cache.versions(tables)
+        if self._snapshot: versions += (self._snapshot.generation(),)
+        return versions
+
+    def get_query_budget(self):
+        """Orçamento por rerun ([database] query_budget / query_budget_ms); 0 ou ausente desativa"""
+        return {
+            "budget_queries": int(self._config.get("query_budget", 0)) or None,
+            "budget_ms": float(self._config.get("query_budget_ms", 0)) or None,
+        }
+
+    @_cached("projects")
     def get_projects(self):
         if not self._engine: return pd.DataFrame()
-        with self._engine.connect() as conn:
+        with self._connect() as conn:
             return pd.read_sql("SELECT id, name FROM projects ORDER BY name", conn)
 
+    @_cached("projects")
     def get_project_details(self, project_id):
         """NOVO: Busca detalhes específicos (Categoria) de uma obra"""
         if not self._engine: return None
         try:
-            with self._engine.connect() as conn:
+            with self._connect() as conn:
                 res = conn.execute(
                     text("SELECT name, category FROM projects WHERE id = :id"), 
                     {"id": project_id}
@@ -31,13 +598,155 @@ class DataManager:
                 return dict(res._mapping) if res else None
         except: return None
 
+    def get_project_bundle(self, project_id):
+        """Tudo o que a tela de gestão precisa de uma obra, numa única ida ao banco
+        (com `delta_sync`, sobre o frame mantido em memória por _delta_project_data).
+
+        Retorna {"header": {name, category}, "tasks": frame de get_project_data,
+        "phases": item_root, total, done por fase, "progress": {total, done, pending}}
+        ou None se a obra não existir. Com o diário local ativo, os status pendentes são
+        aplicados e os contadores recalculados sobre o frame.
+        """
+        if self._delta_sync and self._engine: bundle = self._delta_project_bundle(project_id)
+        else: bundle = self._fetch_project_bundle(project_id)
+        if bundle is None or not self._journal: return bundle
+        tasks = self._overlay_pending(bundle["tasks"], project_id)
+        return dict(bundle, tasks=tasks, **_bundle_counters(tasks))
+
+    def _delta_project_bundle(self, project_id):
+        """Bundle montado sobre o frame do delta sync (cabeçalho em cache, contadores locais)"""
+        header = self.get_project_details(project_id)
+        if header is None: return None
+        tasks = self._delta_project_data(project_id)
+        return {"header": {"name": header.get("name"), "category": header.get("category")}, "tasks": tasks, **_bundle_counters(tasks)}
+
+    @_cached("projects", "tasks", "phases", "sectors", "responsibles", "project_tasks")
+    def _fetch_project_bundle(self, project_id):
+        if not self._engine: return None
+        # fases e total com a mesma normalização, para os cards baterem com a barra geral
+        is_done = f"{STATUS_SQL.format(col='pt.status')} IN ('SIM', 'NÃO SE APLICA')"
+        query = text(f"""
+            SELECT
+                pr.name AS project_name, pr.category,
+                p.title AS phase_title, t.id AS task_id, t.item_number, {self._item_root()} AS item_root,
+                t.title, t.description, t.area, t.stage,
+                s.name AS sector, r.name AS responsible,
+                COALESCE(pt.status, 'NÃO INICIADO') AS status,
+                COUNT(t.id) OVER phase AS phase_total,
+                COUNT(t.id) FILTER (WHERE {is_done}) OVER phase AS phase_done,
+                COUNT(t.id) OVER () AS total,
+                COUNT(t.id) FILTER (WHERE {is_done}) OVER () AS done
+            FROM projects pr
+            LEFT JOIN (
+                tasks t
+                JOIN phases p ON t.phase_id = p.id
+                LEFT JOIN sectors s ON t.sector_id = s.id
+                LEFT JOIN responsibles r ON t.default_responsible_id = r.id
+            ) ON TRUE
+            LEFT JOIN project_tasks pt ON pt.task_id = t.id AND pt.project_id = pr.id
+            WHERE pr.id = :pid
+            WINDOW phase AS (PARTITION BY {self._item_root()})
+            ORDER BY {self._item_order()}
+        """)
+        with self._connect() as conn:
+            df = pd.read_sql(query, conn, params={"pid": project_id})
+        if df.empty: return None
+        first = df.iloc[0]
+        total, done = int(first['total']), int(first['done'])
+        df = df[df['task_id'].notna()].astype({'task_id': 'int64'})
+        phases = df.drop_duplicates('item_root')[['item_root', 'phase_total', 'phase_done']]
+        return {
+            "header": {"name": first['project_name'], "category": first['category']},
+            "tasks": CATEGORIES.encode(df[PROJECT_DATA_COLUMNS].reset_index(drop=True)),
+            "phases": phases.rename(columns={'phase_total': 'total', 'phase_done': 'done'}).reset_index(drop=True),
+            "progress": {"total": total, "done": done, "pending": total - done},
+        }
+
     def get_project_data(self, project_id):
+        if self._delta_sync and self._engine: df = self._delta_project_data(project_id)
+        else: df = self._fetch_project_data(project_id)
+        return self._overlay_pending(df, project_id)
+
+    def _delta_project_data(self, project_id):
+        """Frame da obra mantido em memória e atualizado só com as linhas de project_tasks
+        alteradas desde a última marca d'água (updated_at, com folga); remoções forçam recarga completa."""
+        with self._delta_lock:
+            lock = self._delta_locks.setdefault(project_id, threading.Lock())
+        with lock:
+            catalog = self._cache.versions(("tasks", "phases", "sectors", "responsibles"))
+            status_version = self._cache.versions(("project_tasks",))
+            with self._delta_lock: state = self._delta_states.get(project_id)
+            if state and state["catalog"] == catalog and state["status_version"] == status_version \
+                    and time.monotonic() - state["synced_at"] < self._cache.ttl:
+                return state["frame"].copy()
+
+            if not state or state["catalog"] != catalog:
+                state = self._delta_full_load(project_id, catalog)
+            else:
+                with self._connect() as conn:
+                    changed = conn.execute(
+                        text("SELECT task_id, status, updated_at FROM project_tasks WHERE project_id = :pid AND (CAST(:wm AS TIMESTAMPTZ) IS NULL OR updated_at >= CAST(:wm AS TIMESTAMPTZ) - make_interval(secs => :lag))"),
+                        {"pid": project_id, "wm": state["watermark"], "lag": self._delta_lag},
+                    ).fetchall()
+                    count = conn.execute(text("SELECT COUNT(*) FROM project_tasks WHERE project_id = :pid"), {"pid": project_id}).scalar()
+                # a folga relê linhas já aplicadas: o dicionário deduplica por atividade
+                latest = {tid: status for tid, status, _ in changed}
+                new_rows = set(latest) - state["with_row"]
+                if count != len(state["with_row"]) + len(new_rows):
+                    state = self._delta_full_load(project_id, catalog)
+                elif latest:
+                    _apply_statuses(state["frame"], latest)
+                    state["with_row"] |= new_rows
+                    state["watermark"] = _max_timestamp([state["watermark"]] + [ts for _, _, ts in changed])
+            state["status_version"] = status_version
+            state["synced_at"] = time.monotonic()
+            with self._delta_lock: self._delta_states[project_id] = state
+            return state["frame"].copy()
+
+    def _delta_apply(self, latest, version):
+        """Escrita deste processo: aplica {(project_id, task_id): status} nos frames em memória.
+
+        Só avança a versão do frame se ele estava em dia até a escrita (`version` é a versão
+        de project_tasks logo após o bump); senão a próxima leitura sincroniza pelo banco.
+        """
+        by_project = {}
+        for (pid, tid), status in latest.items(): by_project.setdefault(pid, {})[tid] = status
+        for pid, statuses in by_project.items():
+            with self._delta_lock:
+                state, lock = self._delta_states.get(pid), self._delta_locks.get(pid)
+            if state is None or lock is None: continue
+            with lock:
+                if state["status_version"] != (version[0] - 1,): continue
+                _apply_statuses(state["frame"], statuses)
+                state["with_row"] |= set(statuses)
+                state["status_version"] = version
+
+    def _delta_full_load(self, project_id, catalog):
+        frame = self._fetch_project_data(project_id)
+        with self._connect() as conn:
+            rows = conn.execute(text("SELECT task_id, updated_at FROM project_tasks WHERE project_id = :pid"), {"pid": project_id}).fetchall()
+        return {
+            "frame": frame,
+            "catalog": catalog,
+            "with_row": {tid for tid, _ in rows},
+            "watermark": _max_timestamp([ts for _, ts in rows]),
+        }
+
+    def _overlay_pending(self, df, project_id):
+        """Aplica sobre o frame os status ainda no diário local (escrita adiada)"""
+        if not self._journal or df.empty: return df
+        pending = {tid: status for (_, tid), status in self._journal.pending(project_id).items()}
+        return _apply_statuses(df, pending) if pending else df
+
+    @_cached("tasks", "phases", "sectors", "responsibles", "project_tasks")
+    def _fetch_project_data(self, project_id):
         if not self._engine: return pd.DataFrame()
-        query = text("""
+        query = text(f"""
             SELECT 
                 p.title as phase_title,
                 t.id as task_id, 
                 t.item_number, 
+                {self._item_root()} as item_root,
                 t.title, 
                 t.description, 
                 t.area, 
@@ -50,71 +759,324 @@ class DataManager:
             LEFT JOIN sectors s ON t.sector_id = s.id
             LEFT JOIN responsibles r ON t.default_responsible_id = r.id
             LEFT JOIN project_tasks pt ON t.id = pt.task_id AND pt.project_id = :pid
-            ORDER BY NULLIF(regexp_replace(t.item_number, '[^0-9.]', '', 'g'), '')::numeric
+            ORDER BY {self._item_order()}
         """)
-        with self._engine.connect() as conn:
-            return pd.read_sql(query, conn, params={"pid": project_id})
+        with self._connect() as conn:
+            return CATEGORIES.encode(pd.read_sql(query, conn, params={"pid": project_id}))
 
+    def stream_global_dashboard_data(self, chunksize=STREAM_CHUNK_ROWS):
+        """Produto obras x atividades em blocos, para consumidores que agregam incrementalmente
+        (ex.: metrics.counts_from_chunks) sem materializar o resultado inteiro"""
+        if not self._engine: return iter(())
+        return self._stream(text(GLOBAL_DASHBOARD_SQL), chunksize=chunksize)
+
+    @_cached(*DASHBOARD_TABLES)
     def get_global_dashboard_data(self):
         if not self._engine: return pd.DataFrame()
+        chunks = list(self.stream_global_dashboard_data())
+        if not chunks: return pd.DataFrame()
+        # as categorias só crescem: recodificar no dtype final mantém as colunas categóricas no concat
+        return pd.concat([CATEGORIES.encode(c) for c in chunks], ignore_index=True)
+
+    @_cached(*DASHBOARD_TABLES)
+    def get_dashboard_aggregates(self):
+        """Contagens agregadas no banco para o dashboard (apenas itens reais).
+
+        Retorna dois DataFrames:
+        - "status": project_name, stage, sector, status, qty
+        - "responsible": project_name, sector, responsible, qty, not_done
+        """
+        empty = {
+            "status": pd.DataFrame(columns=["project_name", "stage", "sector", "status", "qty"]),
+            "responsible": pd.DataFrame(columns=["project_name", "sector", "responsible", "qty", "not_done"]),
+        }
+        if not self._engine: return empty
+        if self._analytics:
+            df = self._analytics.counts()
+            if df is not None: return self._split_grouping_sets(CATEGORIES.encode(df), empty)
+        elif self._snapshot:
+            counts = self._snapshot.compute("dashboard_counts", lambda t: {
+                k: CATEGORIES.encode(v) for k, v in counts_from_matrix(t["catalog"], t["projects"], t["statuses"]).items()
+            })
+            if counts is not None: return {k: v.copy() for k, v in counts.items()}
+        query = text(f"""
+            WITH real_tasks AS (
+                SELECT t.id, COALESCE(t.stage, 'GERAL') AS stage,
+                       COALESCE(s.name, 'NÃO DEFINIDO') AS sector,
+                       COALESCE(r.name, 'NÃO ATRIBUÍDO') AS responsible
+                FROM tasks t
+                JOIN phases ph ON t.phase_id = ph.id
+                LEFT JOIN sectors s ON t.sector_id = s.id
+                LEFT JOIN responsibles r ON t.default_responsible_id = r.id
+                WHERE {REAL_ITEM_SQL.format(col="t.item_number")}
+            ), cells AS (
+                SELECT pr.name AS project_name, rt.stage, rt.sector, rt.responsible,
+                       {STATUS_SQL.format(col="pt.status")} AS status
+                FROM projects pr CROSS JOIN real_tasks rt
+                LEFT JOIN project_tasks pt ON pt.task_id = rt.id AND pt.project_id = pr.id
+            )
+            SELECT project_name, stage, sector, responsible, status,
+                   COUNT(*) AS qty,
+                   COUNT(*) FILTER (WHERE status NOT IN ('SIM', 'NÃO SE APLICA')) AS not_done,
+                   GROUPING(status) AS by_responsible
+            FROM cells
+            GROUP BY GROUPING SETS ((project_name, stage, sector, status), (project_name, sector, responsible))
+        """)
+        with self._connect() as conn: df = CATEGORIES.encode(pd.read_sql(query, conn))
+        return self._split_grouping_sets(df, empty)
+
+    @staticmethod
+    def _split_grouping_sets(df, empty):
+        by_resp = df['by_responsible'] == 1
+        return {
+            "status": df.loc[~by_resp, empty["status"].columns].reset_index(drop=True),
+            "responsible": df.loc[by_resp, empty["responsible"].columns].reset_index(drop=True),
+        }
+
+    def _snapshot_version(self):
+        """Versão do snapshot: contagem e checksum do conteúdo de project_tasks + hash das tabelas pequenas.
+
+        O checksum soma o hash de cada célula (obra, item, status), então qualquer mudança de status
+        muda a versão, inclusive escritas que confirmam depois de outras com updated_at maior.
+        """
         query = text("""
-            SELECT pr.name as project_name, ph.title as phase_title, t.item_number, t.stage, s.name as sector, r.name as responsible, COALESCE(pt.status, 'NÃO INICIADO') as status
-            FROM tasks t CROSS JOIN projects pr JOIN phases ph ON t.phase_id = ph.id
-            LEFT JOIN project_tasks pt ON t.id = pt.task_id AND pt.project_id = pr.id
-            LEFT JOIN sectors s ON t.sector_id = s.id LEFT JOIN responsibles r ON t.default_responsible_id = r.id
+            SELECT CONCAT_WS(':',
+                (SELECT CONCAT_WS('/', COUNT(*), SUM(hashtext(CONCAT_WS(',', project_id, task_id, status))::BIGINT)) FROM project_tasks),
+                (SELECT md5(string_agg(CONCAT_WS(',', id, item_number, stage, sector_id, default_responsible_id, phase_id), ';' ORDER BY id)) FROM tasks),
+                (SELECT md5(string_agg(CONCAT_WS(',', id, name), ';' ORDER BY id)) FROM projects),
+                (SELECT md5(string_agg(CONCAT_WS(',', id, name), ';' ORDER BY id)) FROM sectors),
+                (SELECT md5(string_agg(CONCAT_WS(',', id, name), ';' ORDER BY id)) FROM responsibles))
+        """)
+        with self._connect() as conn: return conn.execute(query).scalar()
+
+    def _build_snapshot(self):
+        """Catálogo de itens reais, obras e matriz de status (só as células gravadas)"""
+        catalog = text(f"""
+            SELECT t.id AS task_id, COALESCE(t.stage, 'GERAL') AS stage,
+                   COALESCE(s.name, 'NÃO DEFINIDO') AS sector, COALESCE(r.name, 'NÃO ATRIBUÍDO') AS responsible
+            FROM tasks t
+            JOIN phases ph ON t.phase_id = ph.id
+            LEFT JOIN sectors s ON t.sector_id = s.id
+            LEFT JOIN responsibles r ON t.default_responsible_id = r.id
+            WHERE {REAL_ITEM_SQL.format(col="t.item_number")}
+        """)
+        statuses = text(f"SELECT project_id, task_id, {STATUS_SQL.format(col='status')} AS status FROM project_tasks")
+        with self._connect() as conn:
+            frames = {
+                "catalog": CATEGORIES.encode(pd.read_sql(catalog, conn)),
+                "projects": CATEGORIES.encode(pd.read_sql(text("SELECT id AS project_id, name AS project_name FROM projects"), conn)),
+            }
+        # a matriz de status é a parte grande: vai em blocos direto para o arquivo
+        frames["statuses"] = self._stream(statuses)
+        return frames
+
+    @_cached(*DASHBOARD_TABLES)
+    def get_pending_items(self, limit=10, project_name=None):
+        """Itens reais com status PENDENTE (Radar de Atividades), já limitados no banco"""
+        if not self._engine: return pd.DataFrame()
+        query = text(f"""
+            SELECT pr.name AS project_name, COALESCE(t.stage, 'GERAL') AS stage,
+                   COALESCE(r.name, 'NÃO ATRIBUÍDO') AS responsible, 'PENDENTE' AS status
+            FROM project_tasks pt
+            JOIN projects pr ON pr.id = pt.project_id
+            JOIN tasks t ON t.id = pt.task_id
+            JOIN phases ph ON t.phase_id = ph.id
+            LEFT JOIN responsibles r ON t.default_responsible_id = r.id
+            WHERE {STATUS_SQL.format(col="pt.status")} = 'PENDENTE'
+              AND {REAL_ITEM_SQL.format(col="t.item_number")}
+              AND (CAST(:pname AS TEXT) IS NULL OR pr.name = :pname)
+            ORDER BY pr.name, t.id
+            LIMIT :lim
         """)
-        with self._engine.connect() as conn: return pd.read_sql(query, conn)
+        with self._connect() as conn:
+            return pd.read_sql(query, conn, params={"pname": project_name, "lim": int(limit)})
 
+    @_cached("tasks", "sectors", "responsibles")
     def get_all_tasks_admin(self):
         if not self._engine: return pd.DataFrame()
-        query = text("SELECT t.id, t.item_number, t.title, t.description, t.area, t.stage, s.name as sector_name, r.name as resp_name FROM tasks t LEFT JOIN sectors s ON t.sector_id = s.id LEFT JOIN responsibles r ON t.default_responsible_id = r.id ORDER BY NULLIF(regexp_replace(t.item_number, '[^0-9.]', '', 'g'), '')::numeric")
-        with self._engine.connect() as conn: return pd.read_sql(query, conn)
+        query = text(f"SELECT t.id, t.item_number, t.title, t.description, t.area, t.stage, s.name as sector_name, r.name as resp_name FROM tasks t LEFT JOIN sectors s ON t.sector_id = s.id LEFT JOIN responsibles r ON t.default_responsible_id = r.id ORDER BY {self._item_order()}")
+        with self._connect() as conn: df = pd.read_sql(query, conn)
+        # as listas auxiliares entram no dicionário para que o editor aceite qualquer opção
+        CATEGORIES.dtype('sector', self.get_aux_list('sectors').get('name', []))
+        CATEGORIES.dtype('responsible', self.get_aux_list('responsibles').get('name', []))
+        return CATEGORIES.encode(df)
 
+    @_cached("sectors", "responsibles")
     def get_aux_list(self, table):
         if not self._engine or table not in ['sectors', 'responsibles']: return pd.DataFrame()
-        with self._engine.connect() as conn: return pd.read_sql(f"SELECT id, name FROM {table} ORDER BY name", conn)
+        with self._connect() as conn: return pd.read_sql(f"SELECT id, name FROM {table} ORDER BY name", conn)
 
     def update_single_status(self, project_id, task_id, status):
-        stmt = text("INSERT INTO project_tasks (project_id, task_id, status, updated_at) VALUES (:pid, :tid, :st, NOW()) ON CONFLICT (project_id, task_id) DO UPDATE SET status = EXCLUDED.status, updated_at = NOW()")
+        return self.save_statuses([(project_id, task_id, status)])
+
+    def save_statuses(self, changes):
+        """Mudanças de status vindas da UI: vão para o diário local quando habilitado"""
         try:
-            with self._engine.begin() as conn: conn.execute(stmt, {"pid": project_id, "tid": task_id, "st": status})
+            if self._journal:
+                for pid, tid, status in changes: self._journal.append(pid, tid, status)
+            else: self.update_statuses(changes)
             return True
         except: return False
 
-    def save_task_changes(self, df_edited):
-        if not self._engine: return
-        with self._engine.begin() as conn:
-            sec_map = {name: id for id, name in conn.execute(text("SELECT id, name FROM sectors")).fetchall()}
-            resp_map = {name: id for id, name in conn.execute(text("SELECT id, name FROM responsibles")).fetchall()}
-            for index, row in df_edited.iterrows():
-                sid = sec_map.get(row['sector_name'])
-                rid = resp_map.get(row['resp_name'])
-                conn.execute(text("UPDATE tasks SET description=:d, area=:a, stage=:stg, sector_id=:sid, default_responsible_id=:rid WHERE id=:id"), {"d": row['description'], "a": row['area'], "stg": row['stage'], "sid": sid, "rid": rid, "id": row['id']})
+    def get_failed_statuses(self, project_id=None):
+        """Mudanças do diário descartadas por erro permanente (project_id, task_id, status, error, failed_at)"""
+        columns = ['project_id', 'task_id', 'status', 'error', 'failed_at']
+        if not self._journal: return pd.DataFrame(columns=columns)
+        df = pd.DataFrame(self._journal.failed(project_id), columns=columns)
+        df['failed_at'] = pd.to_datetime(df['failed_at'], unit='s')
+        return df
+
+    def discard_failed_statuses(self, project_id=None):
+        if self._journal: self._journal.discard_failed(project_id)
+
+    def update_statuses(self, changes):
+        """Grava [(project_id, task_id, status)] num único INSERT ... ON CONFLICT (o rollup acompanha pelo trigger)"""
+        if not self._engine or not changes: return 0
+        latest = {(int(pid), int(tid)): status for pid, tid, status in changes}
+        changes = [(pid, tid, status) for (pid, tid), status in latest.items()]
+        values = ", ".join(f"(:pid{i}, :tid{i}, :st{i}, NOW())" for i in range(len(changes)))
+        params = {}
+        for i, (pid, tid, status) in enumerate(changes):
+            params.update({f"pid{i}": int(pid), f"tid{i}": int(tid), f"st{i}": status})
+        with self._connect(begin=True) as conn:
+            conn.execute(text(f"INSERT INTO project_tasks (project_id, task_id, status, updated_at) VALUES {values} ON CONFLICT (project_id, task_id) DO UPDATE SET status = EXCLUDED.status, updated_at = NOW()"), params)
+        self._cache.bump("project_tasks", patch=functools.partial(_patch_bundle_statuses, latest))
+        if self._delta_sync: self._delta_apply(latest, self._cache.versions(("project_tasks",)))
+        return len(changes)
+
+    def save_task_changes(self, df_edited, df_original=None):
+        """Grava apenas as linhas alteradas num único UPDATE ... FROM (VALUES ...).
+
+        Com `df_original` (o frame entregue ao editor) compara célula a célula; sem ele,
+        todas as linhas são gravadas. Retorna o número de atividades alteradas.
+        """
+        if not self._engine: return 0
+        changed = _changed_rows(df_edited, df_original, TASK_EDIT_COLUMNS)
+        if changed.empty: return 0
+        total = 0
+        with self._connect(begin=True) as conn:
+            records = changed[['id'] + TASK_EDIT_COLUMNS].astype(object)
+            records = records.where(records.notna(), None).to_dict('records')
+            for start in range(0, len(records), BATCH_SIZE):
+                chunk = records[start:start + BATCH_SIZE]
+                values, params = [], {}
+                for i, rec in enumerate(chunk):
+                    values.append(f"(CAST(:id{i} AS INTEGER), CAST(:d{i} AS TEXT), CAST(:a{i} AS TEXT), CAST(:stg{i} AS TEXT), CAST(:sec{i} AS TEXT), CAST(:resp{i} AS TEXT))")
+                    params.update({f"id{i}": int(rec['id']), f"d{i}": rec['description'], f"a{i}": rec['area'], f"stg{i}": rec['stage'], f"sec{i}": rec['sector_name'], f"resp{i}": rec['resp_name']})
+                total += conn.execute(text(f"""
+                    UPDATE tasks t SET description = v.d, area = v.a, stage = v.stg, sector_id = s.id, default_responsible_id = r.id
+                    FROM (VALUES {", ".join(values)}) AS v(id, d, a, stg, sec, resp)
+                    LEFT JOIN sectors s ON s.name = v.sec
+                    LEFT JOIN responsibles r ON r.name = v.resp
+                    WHERE t.id = v.id
+                """), params).rowcount
+        self._cache.bump("tasks")
+        return total
 
     def update_aux_list(self, table, df_changes):
-        if not self._engine or table not in ['sectors', 'responsibles']: return
-        with self._engine.begin() as conn:
-            for index, row in df_changes.iterrows():
-                name = str(row['name']).strip().upper()
-                if not name: continue
-                if pd.notna(row.get('id')): conn.execute(text(f"UPDATE {table} SET name=:n WHERE id=:id"), {"n": name, "id": int(row['id'])})
-                else:
-                    exists = conn.execute(text(f"SELECT 1 FROM {table} WHERE name=:n"), {"n": name}).scalar()
-                    if not exists: conn.execute(text(f"INSERT INTO {table} (name) VALUES (:n)"), {"n": name})
-    
+        """Aplica renomeações e inclusões em lote (normalizando os nomes numa passada).
+
+        Retorna {"renamed", "inserted", "conflicts"}; renomeações que colidem com um nome
+        já existente (ou repetido no próprio lote) são ignoradas e listadas em "conflicts".
+        """
+        result = {"renamed": 0, "inserted": 0, "conflicts": []}
+        if not self._engine or table not in ['sectors', 'responsibles']: return result
+        df = df_changes.copy()
+        df['name'] = df['name'].astype(object).fillna('').astype(str).str.strip().str.upper()
+        if 'id' not in df: df['id'] = None
+        df = df[df['name'] != '']
+        dup = df['name'].duplicated(keep='first')
+        result["conflicts"] = df.loc[dup & df['id'].notna(), 'name'].tolist()
+        df = df[~dup]
+        renames = df[df['id'].notna()]
+        inserts = df[df['id'].isna()]
+
+        with self._connect(begin=True) as conn:
+            if not renames.empty:
+                values = ", ".join(f"(CAST(:id{i} AS INTEGER), CAST(:n{i} AS TEXT))" for i in range(len(renames)))
+                params = {}
+                for i, (rid, name) in enumerate(zip(renames['id'], renames['name'])):
+                    params.update({f"id{i}": int(rid), f"n{i}": name})
+                row = conn.execute(text(f"""
+                    WITH v(id, name) AS (VALUES {values}),
+                    conflicts AS (SELECT v.id, v.name FROM v JOIN {table} o ON o.name = v.name AND o.id <> v.id),
+                    upd AS (
+                        UPDATE {table} t SET name = v.name FROM v
+                        WHERE t.id = v.id AND t.name IS DISTINCT FROM v.name
+                          AND v.id NOT IN (SELECT id FROM conflicts)
+                        RETURNING t.id
+                    )
+                    SELECT (SELECT COUNT(*) FROM upd) AS renamed, ARRAY(SELECT name FROM conflicts) AS conflicts
+                """), params).fetchone()
+                result["renamed"] = int(row.renamed)
+                result["conflicts"] += list(row.conflicts or [])
+            if not inserts.empty:
+                values = ", ".join(f"(CAST(:n{i} AS TEXT))" for i in range(len(inserts)))
+                params = {f"n{i}": name for i, name in enumerate(inserts['name'])}
+                result["inserted"] = len(conn.execute(text(f"""
+                    INSERT INTO {table} (name)
+                    SELECT v.name FROM (VALUES {values}) AS v(name)
+                    WHERE NOT EXISTS (SELECT 1 FROM {table} o WHERE o.name = v.name)
+                    ON CONFLICT DO NOTHING
+                    RETURNING id
+                """), params).fetchall())
+        if result["renamed"] or result["inserted"]: self._cache.bump(table)
+        return result
+
+    @_cached(*PROGRESS_TABLES)
     def get_projects_summary(self):
+        """Total e concluídas por obra, com a mesma contagem da tela de gestão e do dashboard.
+
+        total_tasks conta todas as atividades do catálogo (e não só as que já têm linha em
+        project_tasks) e done_tasks usa o status normalizado (CONCLUIDO/OK contam como SIM),
+        para que o card da obra bata com a barra de progresso da gestão.
+        """
         if not self._engine: return pd.DataFrame()
-        query = text("""SELECT p.id, p.name, COALESCE(p.category, 'NÃO DEFINIDO') as category, COUNT(pt.task_id) as total_tasks, COUNT(CASE WHEN pt.status IN ('SIM', 'NÃO SE APLICA') THEN 1 END) as done_tasks FROM projects p LEFT JOIN project_tasks pt ON p.id = pt.project_id GROUP BY p.id, p.name, p.category ORDER BY p.name""")
-        with self._engine.connect() as conn: return pd.read_sql(query, conn)
+        if self._rollup_ready:
+            query = text("""SELECT p.id, p.name, COALESCE(p.category, 'NÃO DEFINIDO') as category, COALESCE(SUM(r.total), 0) as total_tasks, COALESCE(SUM(r.done), 0) as done_tasks FROM projects p LEFT JOIN project_progress_rollup r ON p.id = r.project_id GROUP BY p.id, p.name, p.category ORDER BY p.name""")
+            with self._connect() as conn: return pd.read_sql(query, conn)
+        query = text(f"""SELECT p.id, p.name, COALESCE(p.category, 'NÃO DEFINIDO') as category, COUNT(t.id) as total_tasks,
+            COUNT(t.id) FILTER (WHERE {STATUS_SQL.format(col="pt.status")} IN ('SIM', 'NÃO SE APLICA')) as done_tasks
+            FROM projects p LEFT JOIN (tasks t JOIN phases ph ON t.phase_id = ph.id) ON TRUE
+            LEFT JOIN project_tasks pt ON pt.task_id = t.id AND pt.project_id = p.id
+            GROUP BY p.id, p.name, p.category ORDER BY p.name""")
+        with self._connect() as conn: return pd.read_sql(query, conn)
+
+    @_cached(*PROGRESS_TABLES)
+    def get_project_progress(self, project_id, real_only=False):
+        """Progresso (total/done/pending) de uma obra lido do rollup"""
+        if not self._engine: return None
+        if self._rollup_ready:
+            query = text("SELECT COALESCE(SUM(total), 0) AS total, COALESCE(SUM(done), 0) AS done, COALESCE(SUM(pending), 0) AS pending FROM project_progress_rollup WHERE project_id = :pid AND (real_item OR NOT :real_only)")
+        else:
+            query = text(f"""SELECT COUNT(*) AS total,
+                COUNT(*) FILTER (WHERE {STATUS_SQL.format(col="pt.status")} IN ('SIM', 'NÃO SE APLICA')) AS done,
+                COUNT(*) FILTER (WHERE {STATUS_SQL.format(col="pt.status")} NOT IN ('SIM', 'NÃO SE APLICA')) AS pending
+                FROM tasks t JOIN phases ph ON t.phase_id = ph.id
+                LEFT JOIN project_tasks pt ON pt.task_id = t.id AND pt.project_id = :pid
+                WHERE ({REAL_ITEM_SQL.format(col="t.item_number")} OR NOT :real_only)""")
+        with self._connect() as conn:
+            res = conn.execute(query, {"pid": project_id, "real_only": real_only}).fetchone()
+        return {k: int(v) for k, v in res._mapping.items()}
+
+    @_cached(*PROGRESS_TABLES)
+    def get_progress_by_project(self, real_only=True):
+        """Progresso por obra (project_name, total, done, pending) lido do rollup"""
+        if not self._engine or not self._rollup_ready: return pd.DataFrame()
+        query = text("""SELECT p.name AS project_name, COALESCE(SUM(r.total), 0) AS total, COALESCE(SUM(r.done), 0) AS done, COALESCE(SUM(r.pending), 0) AS pending
+            FROM projects p LEFT JOIN project_progress_rollup r ON r.project_id = p.id AND (r.real_item OR NOT :real_only)
+            GROUP BY p.name ORDER BY p.name""")
+        with self._connect() as conn: return pd.read_sql(query, conn, params={"real_only": real_only})
 
     def save_project(self, name, category, project_id=None):
         if not self._engine: return False
         name = name.strip().upper()
         category = category.strip().upper()
         try:
-            with self._engine.begin() as conn:
+            with self._connect(begin=True) as conn:
                 if project_id: conn.execute(text("UPDATE projects SET name=:n, category=:c WHERE id=:id"), {"n": name, "c": category, "id": project_id})
                 else: conn.execute(text("INSERT INTO projects (name, category) VALUES (:n, :c)"), {"n": name, "c": category})
+            self._cache.bump("projects")
             return True
         except Exception as e:
             st.error(f"Erro: {e}")
@@ -123,8 +1085,14 @@ class DataManager:
     def delete_project(self, project_id):
         if not self._engine: return False
         try:
-            with self._engine.begin() as conn:
+            # mudanças ainda no diário falhariam (FK) depois da remoção
+            if self._journal: self._journal.discard(project_id)
+            with self._connect(begin=True) as conn:
                 conn.execute(text("DELETE FROM project_tasks WHERE project_id=:id"), {"id": project_id})
                 conn.execute(text("DELETE FROM projects WHERE id=:id"), {"id": project_id})
+            self._cache.bump("projects", "project_tasks")
+            with self._delta_lock:
+                self._delta_states.pop(project_id, None)
+                self._delta_locks.pop(project_id, None)
             return True
         except: return False
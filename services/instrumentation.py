@@ -0,0 +1,176 @@
+import sys
+import json
+import time
+import logging
+import threading
+import itertools
+import contextlib
+import contextvars
+from collections import deque
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Funções de infraestrutura do DataManager que não identificam a leitura/escrita
+HELPER_FRAMES = {"_connect", "wrapper", "_run_ddl", "__enter__", "__exit__", "<lambda>"}
+MAX_STATEMENT_CHARS = 300
+
+_current = contextvars.ContextVar("onboarding_rerun", default=None)
+_ids = itertools.count(1)
+_recent_lock = threading.Lock()
+_recent = deque(maxlen=200)  # reruns concluídos do processo (todas as sessões)
+_installed = {}
+
+
+class RerunRecord:
+    """Consultas executadas durante um rerun do Streamlit (uma sessão, uma tela)"""
+
+    def __init__(self, session_id=None, view=None):
+        self.id = next(_ids)
+        self.session_id = session_id
+        self.view = view
+        self.started = time.time()
+        self.elapsed_ms = None
+        self.queries = []
+        self.over_budget = []
+        self._lock = threading.Lock()
+
+    def add(self, query):
+        with self._lock: self.queries.append(query)
+
+    def summary(self):
+        with self._lock: queries = list(self.queries)
+        return {
+            "rerun": self.id, "view": self.view or "-", "queries": len(queries),
+            "db_ms": round(sum(q["ms"] for q in queries), 2), "rows": sum(q["rows"] for q in queries),
+            "elapsed_ms": self.elapsed_ms, "over_budget": ", ".join(self.over_budget),
+        }
+
+
+def begin_rerun(session_id=None, view=None):
+    """Abre o registro do rerun atual (chamado no início do script)"""
+    record = RerunRecord(session_id, view)
+    _current.set(record)
+    return record
+
+
+def set_view(view):
+    record = _current.get()
+    if record: record.view = view
+
+
+def current_rerun():
+    return _current.get()
+
+
+def end_rerun(budget_queries=None, budget_ms=None):
+    """Fecha o rerun, guarda-o entre os recentes e avisa se a tela estourou o orçamento"""
+    record = _current.get()
+    if record is None: return None
+    _current.set(None)
+    record.elapsed_ms = round((time.time() - record.started) * 1000, 2)
+    info = record.summary()
+    if budget_queries and info["queries"] > budget_queries:
+        record.over_budget.append(f"{info['queries']} consultas > {budget_queries}")
+    if budget_ms and info["db_ms"] > budget_ms:
+        record.over_budget.append(f"{info['db_ms']:.0f} ms > {budget_ms} ms")
+    if record.over_budget:
+        logger.warning("Tela '%s' acima do orçamento de consultas: %s", record.view, "; ".join(record.over_budget))
+    with _recent_lock: _recent.append(record)
+    return record
+
+
+@contextlib.contextmanager
+def fragment_rerun(session_id=None, view=None, **budget):
+    """Registro próprio para o rerun de um st.fragment, que não passa pelo begin/end do script.
+
+    Dentro de um rerun completo (registro já aberto) ou sem instrumentação, não faz nada.
+    """
+    if _current.get() is not None or not enabled():
+        yield
+        return
+    begin_rerun(session_id, view)
+    try:
+        yield
+    finally:
+        end_rerun(**budget)
+
+
+def recent_reruns(session_id=None, limit=20):
+    with _recent_lock: records = list(_recent)
+    if session_id is not None: records = [r for r in records if r.session_id == session_id]
+    return records[-limit:]
+
+
+def _calling_method(dm_file):
+    """Cadeia de métodos do DataManager na pilha, do mais externo ao mais interno"""
+    chain = []
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename == dm_file and code.co_name not in HELPER_FRAMES and code.co_name not in chain:
+            chain.append(code.co_name)
+        frame = frame.f_back
+    return ">".join(reversed(chain)) or "-"
+
+
+class QueryInstrumentation:
+    """Hooks before/after_cursor_execute no engine: duração, linhas e método chamador de cada comando.
+
+    Comandos executados fora de um rerun (threads de background) só vão para o log estruturado.
+    """
+
+    def __init__(self, engine, dm_file, log_path=None):
+        self._engine = engine
+        self._dm_file = dm_file
+        self._log_lock = threading.Lock()
+        self._log = open(log_path, "a", encoding="utf-8") if log_path else None
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+        event.listen(engine, "handle_error", self._error)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("onboarding_query_start", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("onboarding_query_start")
+        if not starts: return
+        ms = (time.perf_counter() - starts.pop()) * 1000
+        record = _current.get()
+        query = {
+            "ms": round(ms, 3),
+            "rows": max(cursor.rowcount or 0, 0),
+            "method": _calling_method(self._dm_file),
+            "statement": " ".join(statement.split())[:MAX_STATEMENT_CHARS],
+        }
+        if record is not None: record.add(query)
+        if self._log:
+            entry = dict(query, ts=time.time(), rerun=record.id if record else None, view=record.view if record else None)
+            with self._log_lock:
+                self._log.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self._log.flush()
+
+    def _error(self, context):
+        # comando que falhou não chega ao after_cursor_execute: descarta o início empilhado
+        conn = context.connection
+        starts = conn.info.get("onboarding_query_start") if conn is not None else None
+        if starts: starts.pop()
+
+    def close(self):
+        event.remove(self._engine, "before_cursor_execute", self._before)
+        event.remove(self._engine, "after_cursor_execute", self._after)
+        event.remove(self._engine, "handle_error", self._error)
+        if self._log: self._log.close()
+
+
+def enabled():
+    """Hooks instalados em algum engine do processo"""
+    return bool(_installed)
+
+
+def instrument(engine, dm_file, log_path=None):
+    """Instala os hooks uma única vez por engine (o engine é compartilhado no processo)"""
+    with _recent_lock:
+        if id(engine) not in _installed:
+            _installed[id(engine)] = QueryInstrumentation(engine, dm_file, log_path)
+        return _installed[id(engine)]
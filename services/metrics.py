@@ -0,0 +1,252 @@
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.compute as pc
+except ImportError:  # só usado com as tabelas Arrow do snapshot
+    pc = None
+
+DONE_STATUSES = ['SIM', 'NÃO SE APLICA']
+ALL_PROJECTS = "Todas as Obras"
+
+STATUS_ALIASES = {'NAO SE APLICA': 'NÃO SE APLICA', 'NAO INICIADO': 'NÃO INICIADO', 'CONCLUIDO': 'SIM', 'OK': 'SIM'}
+
+COUNT_DIMS = ['project_name', 'stage', 'sector', 'status']
+RESP_DIMS = ['project_name', 'sector', 'responsible']
+
+
+def fill_missing(series, value):
+    """fillna que também serve para colunas categóricas (o valor vira categoria se ainda não for)"""
+    if isinstance(series.dtype, pd.CategoricalDtype) and value not in series.cat.categories:
+        series = series.cat.add_categories([value])
+    return series.fillna(value)
+
+
+def normalize_status(series):
+    """Mesma normalização de status usada no SQL do DataManager"""
+    return fill_missing(series, 'NÃO INICIADO').astype(str).str.strip().str.upper().replace(STATUS_ALIASES)
+
+
+def real_item_mask(item_numbers):
+    """Item real: contém ponto e não termina em .0 (exclui cabeçalhos de fase)"""
+    item = item_numbers.astype(str).str.strip()
+    return item.str.contains('.', regex=False) & ~item.str.endswith('.0')
+
+
+def counts_from_rows(df):
+    """Converte linhas obra x atividade no formato de DataManager.get_dashboard_aggregates"""
+    rows = pd.DataFrame({
+        'project_name': df['project_name'],
+        'stage': fill_missing(df['stage'], "GERAL"),
+        'sector': fill_missing(df['sector'], "NÃO DEFINIDO"),
+        'responsible': fill_missing(df['responsible'], "NÃO ATRIBUÍDO"),
+        'status': normalize_status(df['status']),
+    })[real_item_mask(df['item_number'])].astype('category')
+    rows['not_done'] = ~rows['status'].isin(DONE_STATUSES)
+
+    status_counts = rows.groupby(COUNT_DIMS, observed=True).size().reset_index(name='qty')
+    resp_counts = rows.groupby(RESP_DIMS, observed=True).agg(qty=('status', 'size'), not_done=('not_done', 'sum')).reset_index()
+    return {"status": status_counts, "responsible": resp_counts}
+
+
+def counts_from_chunks(chunks):
+    """counts_from_rows aplicado bloco a bloco (ex.: DataManager.stream_global_dashboard_data).
+
+    Cada bloco vira contagens parciais pequenas, somadas no fim; o pico de memória fica
+    limitado ao tamanho do bloco, não ao produto obras x atividades.
+    """
+    status_parts, resp_parts = [], []
+    for chunk in chunks:
+        partial = counts_from_rows(chunk)
+        status_parts.append(partial["status"].astype({d: str for d in COUNT_DIMS}))
+        resp_parts.append(partial["responsible"].astype({d: str for d in RESP_DIMS}))
+    if not status_parts:
+        return {"status": pd.DataFrame(columns=COUNT_DIMS + ['qty']), "responsible": pd.DataFrame(columns=RESP_DIMS + ['qty', 'not_done'])}
+    status_counts = pd.concat(status_parts).groupby(COUNT_DIMS, sort=False)['qty'].sum().reset_index()
+    resp_counts = pd.concat(resp_parts).groupby(RESP_DIMS, sort=False)[['qty', 'not_done']].sum().reset_index()
+    return {"status": status_counts, "responsible": resp_counts}
+
+
+def _rank(series, limit=None):
+    series = series[series > 0].sort_values(ascending=False, kind='stable')
+    return series.head(limit) if limit else series
+
+
+def _pct(done, total):
+    return (done / total.where(total > 0) * 100).fillna(0)
+
+
+def dashboard_metrics(counts, sel_project=ALL_PROJECTS, progress=None):
+    """Calcula todos os números e entradas de gráfico do dashboard a partir das contagens.
+
+    Faz um único groupby no nível mais fino (obra, etapa, setor, status) sobre colunas
+    categóricas; os demais níveis saem de somas sobre esse resultado já reduzido.
+    `progress` (opcional) é o rollup por obra usado para os KPIs.
+    """
+    df = counts["status"]
+    df_resp = counts["responsible"]
+    all_projects = sel_project == ALL_PROJECTS
+    if not all_projects:
+        df = df[df['project_name'] == sel_project]
+        df_resp = df_resp[df_resp['project_name'] == sel_project]
+
+    cells = df[COUNT_DIMS].astype('category')
+    qty = df['qty'].astype('int64')
+    is_done = cells['status'].isin(DONE_STATUSES)
+    cells = cells.assign(
+        qty=qty,
+        done=qty.where(is_done, 0),
+        not_done=qty.where(~is_done, 0),
+        pending=qty.where(cells['status'] == 'PENDENTE', 0),
+    )
+    base = cells.groupby(COUNT_DIMS, observed=True)[['qty', 'done', 'not_done', 'pending']].sum()
+    base = base[base['qty'] > 0]
+
+    by_project = base.groupby(level='project_name', observed=True).sum()
+    by_stage = base.groupby(level='stage', observed=True).sum()
+    by_sector = base.groupby(level='sector', observed=True).sum()
+
+    if progress is not None and not progress.empty:
+        scope = progress if all_projects else progress[progress['project_name'] == sel_project]
+        total, done = int(scope['total'].sum()), int(scope['done'].sum())
+    else:
+        total, done = int(base['qty'].sum()), int(base['done'].sum())
+    pending = total - done if total > 0 else 0
+    pct = int((done / total) * 100) if total > 0 else 0
+
+    if all_projects:
+        risk = _rank(by_project['not_done'])
+        risk_label, risk_empty = "Obra com Mais Pendências", "Nenhuma"
+    else:
+        risk = _rank(by_sector['not_done'])
+        risk_label, risk_empty = "Gargalo (Setor)", "Nenhum"
+
+    project_progress = pd.DataFrame({
+        'Obra': by_project.index.astype(str),
+        'Progresso': _pct(by_project['done'], by_project['qty']).values,
+    }).sort_values('Progresso', ascending=True)
+
+    stage_progress = pd.DataFrame({
+        'Etapa': by_stage.index.astype(str),
+        'Progresso': _pct(by_stage['done'], by_stage['qty']).values,
+    }).sort_values('Progresso')
+
+    top_pending = _rank(by_sector['pending'], 5)
+    top_pending = pd.DataFrame({'Setor': top_pending.index.astype(str), 'Qtd': top_pending.values})
+
+    pareto = _rank(by_sector['not_done'])
+    pareto = pd.DataFrame({'Setor': pareto.index.astype(str), 'Qtd': pareto.values})
+    pareto['Acumulado'] = pareto['Qtd'].cumsum() / pareto['Qtd'].sum() * 100 if not pareto.empty else []
+
+    group_col = "project_name" if all_projects else "sector"
+    heat = df_resp.astype({group_col: 'category', 'responsible': 'category'}).groupby([group_col, 'responsible'], observed=True)['not_done'].sum()
+    heat = heat[heat > 0].reset_index().astype({group_col: str, 'responsible': str})
+    heatmap = heat.pivot(index='responsible', columns=group_col, values='not_done').fillna(0) if not heat.empty else pd.DataFrame()
+
+    return {
+        "total": total, "done": done, "pending": pending, "pct": pct,
+        "risk_label": risk_label,
+        "risk_name": str(risk.index[0]) if not risk.empty else risk_empty,
+        "risk_value": int(risk.iloc[0]) if not risk.empty else 0,
+        "project_progress": project_progress,
+        "sunburst": base.reset_index()[['stage', 'sector', 'status', 'qty']].astype({'stage': str, 'sector': str, 'status': str}),
+        "top_pending": top_pending,
+        "pareto": pareto,
+        "stage_progress": stage_progress,
+        "heatmap": heatmap,
+        "heatmap_x_label": "Obra" if all_projects else "Setor",
+    }
+
+
+def root_ids(item_root):
+    """Rótulo da fase a partir de item_root ("?" para itens sem número)"""
+    return item_root.astype('Int64').astype(str).where(item_root.notna(), "?")
+
+
+def phase_metrics(df, sel_sector="Todos", sel_status="Todos", counters=None):
+    """Estatísticas por fase (root_id) e posições das atividades visíveis, num único groupby.
+
+    Retorna uma lista na ordem do frame (já hierárquica) com root, phase_label, total, done,
+    pending, pct e rows (posições para df.iloc); fases sem atividades visíveis são omitidas.
+    `counters` ({root_id: (total, done)}, ex.: de get_project_bundle) dispensa a contagem local.
+    """
+    is_done = df['status'].isin(DONE_STATUSES).to_numpy()
+    visible = np.ones(len(df), dtype=bool)
+    if sel_sector != "Todos": visible &= (df['sector'] == sel_sector).to_numpy()
+    if sel_status != "Todos": visible &= (df['status'] == sel_status).to_numpy()
+
+    grouped = df.groupby('root_id', sort=False, observed=True)
+    titles = grouped['phase_title'].first()
+
+    phases = []
+    for root, pos in grouped.indices.items():
+        rows = pos[visible[pos]]
+        if not len(rows): continue
+        if counters and root in counters: total, done = counters[root]
+        else: total, done = len(pos), int(is_done[pos].sum())
+        phases.append({
+            "root": root,
+            "phase_label": f"{root} - {titles[root]}",
+            "total": total,
+            "done": done,
+            "pending": total - done,
+            "pct": int((done / total) * 100) if total else 0,
+            "rows": rows,
+        })
+    # grouped.indices não garante a ordem de aparição; a posição da 1ª linha de cada fase define a ordem
+    phases.sort(key=lambda p: grouped.indices[p["root"]][0])
+    return phases
+
+
+def _as_frame(table):
+    return table if isinstance(table, pd.DataFrame) else table.to_pandas()
+
+
+def _status_cells(statuses):
+    """project_id, task_id e status (categórico) da matriz, sem materializar texto por célula"""
+    if isinstance(statuses, pd.DataFrame):
+        return statuses[['project_id', 'task_id', 'status']].astype({'status': 'category'})
+    # tabela Arrow do snapshot: o status vira códigos de dicionário; as colunas inteiras são copiadas uma vez
+    status = pc.dictionary_encode(pc.fill_null(statuses.column('status'), 'NÃO INICIADO')).combine_chunks()
+    return pd.DataFrame({
+        'project_id': statuses.column('project_id').to_numpy(),
+        'task_id': statuses.column('task_id').to_numpy(),
+        'status': pd.Categorical.from_codes(status.indices.to_numpy(zero_copy_only=False), status.dictionary.to_pylist()),
+    })
+
+
+def counts_from_matrix(catalog, projects, statuses):
+    """Contagens do dashboard a partir do catálogo (itens reais), das obras e da matriz de status.
+
+    Aceita DataFrames ou tabelas Arrow (snapshot). Só as células com status gravado são
+    percorridas, agrupadas por códigos inteiros (obra, grupo do catálogo, status); as demais
+    (NÃO INICIADO) saem da diferença entre o tamanho de cada grupo e as células explícitas.
+    """
+    dims = ['stage', 'sector', 'responsible']
+    catalog = _as_frame(catalog)[['task_id'] + dims].astype({d: str for d in dims})
+    projects = _as_frame(projects)[['project_id', 'project_name']].astype({'project_name': str})
+    cells = _status_cells(statuses)
+
+    group_ids = catalog.groupby(dims, sort=False).ngroup().to_numpy()
+    groups = catalog[dims].assign(gid=group_ids).drop_duplicates('gid').set_index('gid')
+    cells = cells.assign(gid=cells['task_id'].map(pd.Series(group_ids, index=catalog['task_id'].to_numpy())))
+    cells = cells[cells['gid'].notna() & cells['project_id'].isin(projects['project_id'])]
+    explicit = cells.astype({'gid': 'int64'}).groupby(['project_id', 'gid', 'status'], observed=True).size()
+
+    sizes = pd.Series(group_ids).value_counts().sort_index()
+    expected = pd.Series(
+        np.tile(sizes.to_numpy(), len(projects)),
+        index=pd.MultiIndex.from_product([projects['project_id'], sizes.index], names=['project_id', 'gid']),
+    )
+    filled = explicit.groupby(level=['project_id', 'gid']).sum()
+    missing = expected.sub(filled, fill_value=0)
+    missing = missing[missing > 0].to_frame('qty').assign(status='NÃO INICIADO').set_index('status', append=True)['qty']
+
+    counts = pd.concat([explicit.rename('qty').astype('int64'), missing.astype('int64')]).reset_index()
+    counts['status'] = counts['status'].astype(str)
+    counts = counts.join(groups, on='gid').merge(projects, on='project_id')
+    counts['not_done'] = counts['qty'].where(~counts['status'].isin(DONE_STATUSES), 0)
+
+    status_counts = counts.groupby(COUNT_DIMS, sort=False)['qty'].sum().reset_index()
+    resp_counts = counts.groupby(RESP_DIMS, sort=False)[['qty', 'not_done']].sum().reset_index()
+    return {"status": status_counts, "responsible": resp_counts}
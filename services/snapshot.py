@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow vem com o streamlit; sem ele o snapshot fica desabilitado
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+STALE_LOCK_SECONDS = 600
+KEEP_GENERATIONS = 2  # a atual e a anterior (leitores que já leram o ponteiro antigo)
+
+
+def _write_chunks(chunks, path):
+    """Grava um iterável de DataFrames como um único arquivo Arrow IPC, bloco a bloco.
+
+    Colunas categóricas vão como texto: o dicionário pode crescer entre blocos e o formato de
+    arquivo não aceita substituí-lo.
+    """
+    writer = schema = None
+    try:
+        for chunk in chunks:
+            chunk = chunk.astype({c: object for c, dtype in chunk.dtypes.items() if str(dtype) == "category"})
+            batch = pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False)
+            if writer is None:
+                schema = batch.schema
+                writer = pa.ipc.new_file(path, schema)
+            writer.write_batch(batch)
+    finally:
+        if writer is not None: writer.close()
+    if writer is None: feather.write_feather(pa.table({}), path, compression="uncompressed")
+
+
+class DashboardSnapshot:
+    """Snapshot local em Arrow IPC (sem compressão, lido com memory map) dos dados do dashboard.
+
+    `build_fn()` devolve {nome: DataFrame ou iterável de DataFrames (gravado em blocos)};
+    `version_fn()` devolve uma string que muda quando os dados mudam. Cada reconstrução grava
+    uma geração nova num diretório próprio e só então troca o ponteiro (meta.json) com um único
+    os.replace, então um leitor nunca mistura arquivos de gerações diferentes. Vários processos
+    compartilham os mesmos arquivos (e o page cache): os consumidores recebem as tabelas Arrow
+    mapeadas e só o que `compute()` derivar delas fica em memória, uma vez por geração.
+    """
+
+    def __init__(self, directory, build_fn, version_fn):
+        self._dir = directory
+        self._build_fn = build_fn
+        self._version_fn = version_fn
+        self._lock = threading.Lock()
+        self._building = False
+        self._derived = {}
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def available(self):
+        return pa is not None
+
+    def _path(self, generation, name):
+        return os.path.join(self._dir, generation, f"{name}.arrow")
+
+    def _meta_path(self):
+        return os.path.join(self._dir, "meta.json")
+
+    def stored_version(self):
+        try:
+            with open(self._meta_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def generation(self):
+        """Geração publicada no ponteiro (None antes da primeira reconstrução)"""
+        meta = self.stored_version()
+        return meta.get("generation") if meta else None
+
+    def current(self):
+        """(versão, meta) se os arquivos estiverem em dia; senão agenda a reconstrução e retorna None"""
+        if not self.available: return None
+        version = self._version_fn()
+        meta = self.stored_version()
+        if not meta or meta.get("version") != version or "generation" not in meta:
+            self.rebuild_async(version)
+            return None
+        return version, meta
+
+    def tables(self, meta):
+        """Tabelas Arrow do snapshot descrito por `meta` (de current()), mapeadas em memória sem cópia"""
+        return {name: feather.read_table(self._path(meta["generation"], name), memory_map=True) for name in meta["tables"]}
+
+    def compute(self, key, fn):
+        """`fn(tabelas)` calculado uma vez por geração e reaproveitado (o valor não deve ser alterado).
+
+        Retorna None se o snapshot não estiver em dia (a reconstrução fica agendada).
+        """
+        fresh = self.current()
+        if fresh is None: return None
+        _, meta = fresh
+        with self._lock:
+            cached = self._derived.get(key)
+            if cached and cached[0] == meta["generation"]: return cached[1]
+        try:
+            value = fn(self.tables(meta))
+        except FileNotFoundError:  # geração removida entre a leitura do ponteiro e a abertura
+            return None
+        with self._lock:
+            self._derived[key] = (meta["generation"], value)
+        return value
+
+    def _remove_old_generations(self, current):
+        generations = sorted(
+            (d for d in os.listdir(self._dir) if d.startswith("gen-") and d != current),
+            key=lambda d: os.path.getmtime(os.path.join(self._dir, d)),
+        )
+        for old in generations[:max(len(generations) - (KEEP_GENERATIONS - 1), 0)]:
+            shutil.rmtree(os.path.join(self._dir, old), ignore_errors=True)
+        for name in os.listdir(self._dir):  # arquivos soltos do formato anterior
+            if name.endswith(".arrow"): os.remove(os.path.join(self._dir, name))
+
+    def rebuild_async(self, version=None):
+        with self._lock:
+            if self._building: return
+            self._building = True
+        threading.Thread(target=self._rebuild, args=(version,), name="dashboard-snapshot", daemon=True).start()
+
+    def _rebuild(self, version):
+        lock_path = os.path.join(self._dir, ".build.lock")
+        try:
+            if time.time() - os.path.getmtime(lock_path) > STALE_LOCK_SECONDS: os.remove(lock_path)
+        except OSError:
+            pass
+        try:
+            # trava entre processos: só um servidor reconstrói por vez
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            with self._lock: self._building = False
+            return
+        try:
+            version = version or self._version_fn()
+            frames = self._build_fn()
+            generation = f"gen-{time.time_ns()}-{os.getpid()}"
+            os.makedirs(os.path.join(self._dir, generation))
+            for name, df in frames.items():
+                if hasattr(df, "columns"): feather.write_feather(df, self._path(generation, name), compression="uncompressed")
+                else: _write_chunks(df, self._path(generation, name))
+            tmp = self._meta_path() + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"version": version, "generation": generation, "tables": list(frames)}, f)
+            os.replace(tmp, self._meta_path())
+            self._remove_old_generations(generation)
+        except Exception as e:
+            logger.warning("Falha ao reconstruir snapshot do dashboard: %s", e)
+        finally:
+            os.close(fd)
+            os.remove(lock_path)
+            with self._lock: self._building = False
@@ -0,0 +1,181 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos; use um status_journal por processo
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF_SECONDS = 30
+
+
+class StatusJournal:
+    """Diário local (SQLite em WAL) das mudanças de status com descarga em lote em background.
+
+    `append` grava só no disco local; a thread chama `flush_fn(changes)` com a lista
+    [(project_id, task_id, status)] (última mudança por atividade) e só apaga do diário
+    o que foi confirmado. O que sobrar após uma queda é reenviado na próxima inicialização.
+
+    Falhas transitórias (banco fora do ar) são repetidas com backoff. Um lote que falha com
+    um dos `permanent_errors` (ex.: obra removida, status inválido) é reenviado mudança a
+    mudança e as que falharem de novo vão para status_journal_failed (ver `failed()`), para
+    que não travem as mudanças seguintes.
+
+    Vários processos podem usar o mesmo `path` (todos leem o mesmo secrets.toml): leitura,
+    descarga e remoção de um lote acontecem sob um flock em `path + ".lock"`, para que um
+    processo não regrave um status antigo depois que outro já enviou um mais novo.
+    """
+
+    def __init__(self, path, flush_fn, interval=1.0, batch_size=500, permanent_errors=()):
+        directory = os.path.dirname(path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        self._flush_fn = flush_fn
+        self._interval = interval
+        self._batch_size = batch_size
+        self._permanent_errors = tuple(permanent_errors)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # um lote por vez (thread, close() e discard())
+        self._lock_file = open(path + ".lock", "a")
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS status_journal (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                project_id INTEGER NOT NULL,
+                task_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS status_journal_failed (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                project_id INTEGER NOT NULL,
+                task_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                failed_at REAL NOT NULL
+            )
+        """)
+        self._thread = threading.Thread(target=self._run, name="status-journal-flusher", daemon=True)
+        self._thread.start()
+        self._wake.set()  # reenvia o que ficou pendente de uma execução anterior
+
+    def append(self, project_id, task_id, status):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO status_journal (project_id, task_id, status, created_at) VALUES (?, ?, ?, ?)",
+                (int(project_id), int(task_id), status, time.time()),
+            )
+        self._wake.set()
+
+    def pending(self, project_id=None):
+        """Último status ainda não descarregado por (project_id, task_id)"""
+        query = "SELECT project_id, task_id, status FROM status_journal"
+        params = ()
+        if project_id is not None:
+            query += " WHERE project_id = ?"
+            params = (int(project_id),)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY seq", params).fetchall()
+        return {(pid, tid): status for pid, tid, status in rows}
+
+    def backlog(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM status_journal").fetchone()[0]
+
+    def failed(self, project_id=None):
+        """Mudanças descartadas por erro permanente: [(project_id, task_id, status, error, failed_at)]"""
+        query = "SELECT project_id, task_id, status, error, failed_at FROM status_journal_failed"
+        params = ()
+        if project_id is not None:
+            query += " WHERE project_id = ?"
+            params = (int(project_id),)
+        with self._lock:
+            return self._conn.execute(query + " ORDER BY seq", params).fetchall()
+
+    def discard_failed(self, project_id=None):
+        with self._lock:
+            if project_id is None: self._conn.execute("DELETE FROM status_journal_failed")
+            else: self._conn.execute("DELETE FROM status_journal_failed WHERE project_id = ?", (int(project_id),))
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        """Um lote por vez entre as threads e entre os processos que compartilham o diário"""
+        with self._flush_lock:
+            if fcntl: fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl: fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def discard(self, project_id):
+        """Remove as mudanças pendentes (e falhas) de uma obra, esperando o lote em andamento"""
+        with self._exclusive(), self._lock:
+            self._conn.execute("DELETE FROM status_journal WHERE project_id = ?", (int(project_id),))
+            self._conn.execute("DELETE FROM status_journal_failed WHERE project_id = ?", (int(project_id),))
+
+    def flush(self):
+        """Descarrega um lote; retorna quantas mudanças foram confirmadas (ou descartadas)"""
+        with self._exclusive():
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT seq, project_id, task_id, status FROM status_journal ORDER BY seq LIMIT ?",
+                    (self._batch_size,),
+                ).fetchall()
+            if not rows: return 0
+            latest = {(pid, tid): status for _, pid, tid, status in rows}
+            changes = [(pid, tid, status) for (pid, tid), status in latest.items()]
+            try:
+                self._flush_fn(changes)
+            except self._permanent_errors:
+                self._flush_each(changes)
+            with self._lock:
+                self._conn.execute("DELETE FROM status_journal WHERE seq <= ?", (rows[-1][0],))
+            return len(latest)
+
+    def _flush_each(self, changes):
+        """Isola as mudanças que falham de forma permanente; erros transitórios sobem (o lote é repetido)"""
+        for change in changes:
+            try:
+                self._flush_fn([change])
+            except self._permanent_errors as e:
+                logger.error("Mudança de status descartada (obra %s, atividade %s, %r): %s", *change, e)
+                with self._lock:
+                    self._conn.execute(
+                        "INSERT INTO status_journal_failed (project_id, task_id, status, error, failed_at) VALUES (?, ?, ?, ?, ?)",
+                        (*change, str(e)[:500], time.time()),
+                    )
+
+    def _run(self):
+        backoff = None
+        while not self._stop.is_set():
+            # durante o backoff, novas mudanças (append) não antecipam a nova tentativa
+            if backoff: self._stop.wait(backoff)
+            else: self._wake.wait(self._interval)
+            self._wake.clear()
+            try:
+                while self.flush(): pass
+                backoff = None
+            except Exception as e:
+                logger.warning("Falha ao descarregar diário de status: %s", e)
+                backoff = min((backoff or self._interval) * 2, MAX_BACKOFF_SECONDS)
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=5)
+        try:
+            self.flush()
+        finally:
+            self._conn.close()
+            self._lock_file.close()
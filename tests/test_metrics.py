@@ -0,0 +1,47 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("streamlit")
+pytest.importorskip("sqlalchemy")
+
+from services.data_manager import CategoryRegistry
+from services.metrics import counts_from_chunks
+
+
+def test_counts_from_chunks_with_categorical_chunks_on_fresh_registry():
+    # blocos como os de DataManager._stream: colunas categóricas de um registro que ainda não
+    # conhece os valores de preenchimento (GERAL, NÃO DEFINIDO, NÃO ATRIBUÍDO, NÃO INICIADO)
+    registry = CategoryRegistry({})
+    chunks = [
+        registry.encode(pd.DataFrame({
+            "project_name": ["OBRA 1", "OBRA 1", "OBRA 1"],
+            "item_number": ["1.0", "1.1", "1.2"],
+            "stage": [None, None, "EXECUÇÃO"],
+            "sector": [None, None, "SETOR 1"],
+            "responsible": [None, "RESP 1", None],
+            "status": ["PENDENTE", "SIM", None],
+        })),
+        registry.encode(pd.DataFrame({
+            "project_name": ["OBRA 2"],
+            "item_number": ["1.1"],
+            "stage": [None],
+            "sector": [None],
+            "responsible": [None],
+            "status": ["ok"],
+        })),
+    ]
+
+    counts = counts_from_chunks(iter(chunks))
+
+    status = {tuple(r) for r in counts["status"][["project_name", "stage", "sector", "status", "qty"]].itertuples(index=False)}
+    assert status == {
+        ("OBRA 1", "GERAL", "NÃO DEFINIDO", "SIM", 1),
+        ("OBRA 1", "EXECUÇÃO", "SETOR 1", "NÃO INICIADO", 1),
+        ("OBRA 2", "GERAL", "NÃO DEFINIDO", "SIM", 1),
+    }
+    responsible = {tuple(r) for r in counts["responsible"][["project_name", "sector", "responsible", "qty", "not_done"]].itertuples(index=False)}
+    assert responsible == {
+        ("OBRA 1", "NÃO DEFINIDO", "RESP 1", 1, 0),
+        ("OBRA 1", "SETOR 1", "NÃO ATRIBUÍDO", 1, 1),
+        ("OBRA 2", "NÃO DEFINIDO", "NÃO ATRIBUÍDO", 1, 0),
+    }
@@ -0,0 +1,42 @@
+import os
+import base64
+import functools
+import streamlit as st
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+MIME_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".css": "text/css"}
+
+
+def static_path(name):
+    return os.path.join(STATIC_DIR, name)
+
+
+def static_serving():
+    """[server] enableStaticServing ligado: os arquivos de static/ saem em app/static/<nome>"""
+    try:
+        return bool(st.get_option("server.enableStaticServing"))
+    except Exception:
+        return False
+
+
+@functools.lru_cache(maxsize=None)
+def read_static(name):
+    """Conteúdo de static/<nome>, lido uma vez por processo (None se não existir)"""
+    path = static_path(name)
+    if not os.path.exists(path): return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=None)
+def data_uri(name):
+    data = read_static(name)
+    if data is None: return None
+    mime = MIME_TYPES.get(os.path.splitext(name)[1].lower(), "application/octet-stream")
+    return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+
+def asset_url(name):
+    """URL do arquivo: servida pelo Streamlit quando possível, senão data URI codificada uma vez"""
+    if static_serving() and os.path.exists(static_path(name)): return f"app/static/{name}"
+    return data_uri(name)
@@ -0,0 +1,67 @@
+import time
+import threading
+from collections import OrderedDict
+import streamlit as st
+from utils import profiler
+
+FIGURE_CACHE_DEFAULTS = {"cache_ttl": 300, "figure_cache_entries": 64}
+
+
+class FigureCache:
+    """LRU com TTL de figuras plotly prontas, compartilhado entre as sessões.
+
+    A figura montada é guardada e entregue como está ao st.plotly_chart, que a serializa uma
+    vez; nada é desserializado e revalidado a cada rerun (um dict seria reconvertido em Figure
+    com validação). As figuras guardadas não devem ser alteradas por quem as recebe.
+
+    A chave inclui a versão dos dados (DataManager.data_version): uma escrita, local ou de outro
+    processo, ou um snapshot novo muda a versão e as figuras antigas saem pelo LRU. O TTL
+    acompanha o do cache de consultas, cobrindo mudanças externas sem change feed.
+    """
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        """Figura da chave; `build()` só é chamado quando não há entrada válida"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        fig = build()
+        if fig is None or self.ttl <= 0 or self._max_entries <= 0: return fig
+        with self._lock:
+            self._entries[key] = (fig, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return fig
+
+    def clear(self):
+        with self._lock: self._entries.clear()
+
+
+@st.cache_resource(show_spinner=False)
+def get_figure_cache():
+    try:
+        config = st.secrets.get("database", {})
+    except Exception:
+        config = {}
+    return FigureCache(
+        float(config.get("cache_ttl", FIGURE_CACHE_DEFAULTS["cache_ttl"])),
+        int(config.get("figure_cache_entries", FIGURE_CACHE_DEFAULTS["figure_cache_entries"])),
+    )
+
+
+def cached_figure(version, chart_id, scope, build):
+    """Figura `chart_id` para o escopo (ex.: obra selecionada) na versão de dados informada"""
+    return get_figure_cache().get((chart_id, scope, version), lambda: profiler.timed("figure", build))
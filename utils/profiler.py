@@ -0,0 +1,172 @@
+import json
+import time
+import threading
+import functools
+import contextvars
+import streamlit as st
+import pandas as pd
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+HTML_ELEMENTS = {"markdown", "html"}
+
+_active = contextvars.ContextVar("onboarding_profile", default=None)
+_record_lock = threading.Lock()
+
+
+class RenderProfile:
+    """Tempo de uma tela dividido em busca, figuras e emissão; o restante é transformação"""
+
+    def __init__(self, view):
+        self.view = view
+        self.times = {"fetch": 0.0, "figure": 0.0, "emit": 0.0}
+        self.calls = {"fetch": 0, "figure": 0, "emit": 0}
+        self.elements = 0
+        self.html_bytes = 0
+        self.payload_bytes = 0
+        self.total = 0.0
+        self._depth = 0
+
+    def timed(self, bucket, fn, *args, **kwargs):
+        # só o trecho mais externo conta (get_project_bundle chama outras leituras do DataManager...)
+        if self._depth:
+            return fn(*args, **kwargs)
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.times[bucket] += time.perf_counter() - start
+            self.calls[bucket] += 1
+            self._depth -= 1
+
+    def count(self, msg):
+        """Mensagem enviada ao navegador durante a tela: elementos, HTML e bytes do payload"""
+        if msg.WhichOneof("type") != "delta" or msg.delta.WhichOneof("type") != "new_element": return
+        element = msg.delta.new_element
+        self.elements += 1
+        self.payload_bytes += msg.ByteSize()
+        kind = element.WhichOneof("type")
+        if kind in HTML_ELEMENTS:
+            self.html_bytes += len(getattr(element, kind).body.encode())
+
+    def result(self):
+        ms = {k: round(v * 1000, 2) for k, v in self.times.items()}
+        total = round(self.total * 1000, 2)
+        return {
+            "view": self.view, "ts": time.time(), "total_ms": total,
+            "fetch_ms": ms["fetch"], "transform_ms": round(max(total - sum(ms.values()), 0), 2),
+            "figure_ms": ms["figure"], "emit_ms": ms["emit"],
+            "fetch_calls": self.calls["fetch"], "figures": self.calls["figure"],
+            "elements": self.elements, "html_kib": round(self.html_bytes / 1024, 1),
+            "payload_kib": round(self.payload_bytes / 1024, 1),
+        }
+
+
+class _ProfiledDataManager:
+    """Repassa tudo ao DataManager, medindo as chamadas como busca de dados"""
+
+    def __init__(self, dm, profile):
+        self._dm = dm
+        self._profile = profile
+
+    def __getattr__(self, name):
+        attr = getattr(self._dm, name)
+        if not callable(attr): return attr
+        profile = self._profile
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            return profile.timed("fetch", attr, *args, **kwargs)
+        return call
+
+
+def timed(bucket, fn, *args, **kwargs):
+    """Mede `fn` no perfil da tela em andamento ("figure" ou "emit"); fora dele só chama"""
+    profile = _active.get()
+    if profile is None: return fn(*args, **kwargs)
+    return profile.timed(bucket, fn, *args, **kwargs)
+
+
+def plotly_chart(fig, **kwargs):
+    """st.plotly_chart medido como emissão (serialização da figura + envio)"""
+    return timed("emit", st.plotly_chart, fig, **kwargs)
+
+
+def dataframe(data, **kwargs):
+    """st.dataframe medido como emissão (conversão para Arrow + envio)"""
+    return timed("emit", st.dataframe, data, **kwargs)
+
+
+def _settings():
+    try:
+        return st.secrets.get("profiling", {})
+    except Exception:
+        return {}
+
+
+def enabled():
+    """Ligado por [profiling] enabled = true nos secrets ou ?profile=1 na URL"""
+    return bool(_settings().get("enabled")) or st.query_params.get("profile") == "1"
+
+
+def _counting(profile, enqueue):
+    def wrapper(msg):
+        profile.count(msg)
+        return enqueue(msg)
+    return wrapper
+
+
+def profiled(view, render_fn):
+    """Envolve uma função render_*(dm, ...) registrando o perfil do rerun na sessão.
+
+    Nada é alterado fora da tela perfilada: as buscas passam pelo proxy do DataManager, figuras
+    e emissão pelos helpers deste módulo, e os elementos são contados trocando o enqueue só do
+    contexto deste rerun (restaurado no fim).
+    """
+    @functools.wraps(render_fn)
+    def wrapper(dm, *args, **kwargs):
+        if not enabled(): return render_fn(dm, *args, **kwargs)
+        profile = RenderProfile(view)
+        ctx = get_script_run_ctx()
+        enqueue = getattr(ctx, "_enqueue", None)
+        if enqueue is not None: ctx._enqueue = _counting(profile, enqueue)
+        token = _active.set(profile)
+        start = time.perf_counter()
+        try:
+            return render_fn(_ProfiledDataManager(dm, profile), *args, **kwargs)
+        finally:
+            profile.total = time.perf_counter() - start
+            _active.reset(token)
+            if enqueue is not None: ctx._enqueue = enqueue
+            _record(profile.result())
+    return wrapper
+
+
+def _record(result):
+    history = st.session_state.setdefault('_profiles', [])
+    history.append(result)
+    del history[:-20]
+    path = _settings().get("output")
+    if path:
+        with _record_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+def render_panel():
+    """Painel recolhível na sidebar com o perfil mais recente e o histórico da sessão"""
+    history = st.session_state.get('_profiles')
+    if not enabled() or not history: return
+    last = history[-1]
+    with st.sidebar.expander(f"Profiler • {last['view']} {last['total_ms']:.0f} ms"):
+        split = pd.DataFrame({
+            "Etapa": ["Busca", "Transformação", "Figuras", "Emissão"],
+            "ms": [last["fetch_ms"], last["transform_ms"], last["figure_ms"], last["emit_ms"]],
+        })
+        st.dataframe(split, hide_index=True, use_container_width=True)
+        st.caption(
+            f"{last['elements']} elementos • {last['html_kib']} KiB de HTML • {last['payload_kib']} KiB enviados • "
+            f"{last['fetch_calls']} buscas • {last['figures']} figuras montadas"
+        )
+        st.dataframe(
+            pd.DataFrame(history[::-1])[["view", "total_ms", "fetch_ms", "transform_ms", "figure_ms", "emit_ms", "elements", "html_kib", "payload_kib"]],
+            hide_index=True, use_container_width=True,
+        )
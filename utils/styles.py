@@ -1,117 +1,37 @@
+import os
+import functools
 import streamlit as st
+from utils.assets import static_path, static_serving, read_static
 
-def apply_custom_styles():
-    st.markdown("""
-    <style>
-    
+STYLESHEET = "onboarding.css"
 
-        html, body, [class*="css"] {
-            font-family: 'Inter', sans-serif;
-            color: #ffffff;
-        }
 
-        /* --- 0. FUNDO COM GRADIENTE (Identidade Visual) --- */
-        .stApp {
-            /* Gradiente sutil Dark + Toque do Laranja no topo */
-            background: linear-gradient(180deg, rgba(227, 112, 38, 0.15) 0%, rgba(0, 0, 0, 0) 30%), 
-                        linear-gradient(135deg, #111111 0%, #000000 100%);
-            background-attachment: fixed;
-        }
+@functools.lru_cache(maxsize=None)
+def _stylesheet_version():
+    try:
+        return int(os.path.getmtime(static_path(STYLESHEET)))
+    except OSError:
+        return 0
 
-        /* --- 1. LIMPEZA VISUAL --- */
-        #MainMenu {visibility: hidden;}
-        footer {visibility: hidden;}
-        header {visibility: hidden;}
-        
-        .block-container {
-            padding-top: 1.5rem !important;
-            padding-bottom: 1rem !important;
-            max-width: 95% !important;
-        }
 
-        /* --- 2. SIDEBAR DARK --- */
-        [data-testid="stSidebar"] {
-            background-color: #000000;
-            border-right: 1px solid rgba(255, 255, 255, 0.1);
-        }
+def apply_custom_styles():
+    """Inclui static/onboarding.css em todas as telas (chamada uma vez no topo do script).
+
+    O Streamlit descarta no fim do rerun os elementos não reemitidos, então a folha entra a
+    cada rerun, mas só como um <link> de poucos bytes (o navegador guarda o CSS em cache).
+    Sem static serving, o CSS é lido uma vez por processo e embutido.
+    """
+    if static_serving():
+        st.markdown(f'<link rel="stylesheet" href="app/static/{STYLESHEET}?v={_stylesheet_version()}">', unsafe_allow_html=True)
+    else:
+        css = read_static(STYLESHEET)
+        if css: st.markdown(f"<style>{css.decode()}</style>", unsafe_allow_html=True)
 
-        /* --- 3. CARDS FLUTUANTES --- */
-        .metric-card {
-            background: rgba(255, 255, 255, 0.03); /* Efeito Glass fraco */
-            border: 1px solid rgba(255, 255, 255, 0.1);
-            border-radius: 12px;
-            padding: 24px;
-            backdrop-filter: blur(10px);
-            transition: all 0.3s ease;
-        }
-        
-        .metric-card:hover {
-            border-color: #E37026; /* LARANJA PRIMARY */
-            box-shadow: 0 4px 20px rgba(227, 112, 38, 0.2); /* Glow Laranja */
-            transform: translateY(-2px);
-        }
-        
-        .metric-label {
-            color: rgba(255, 255, 255, 0.6);
-            font-size: 0.875rem;
-            font-weight: 500;
-            text-transform: uppercase;
-            letter-spacing: 0.05em;
-        }
-        
-        .metric-value {
-            color: #ffffff;
-            font-size: 2.25rem;
-            font-weight: 700;
-            margin-top: 8px;
-            line-height: 1;
-        }
 
-        .metric-delta {
-            display: inline-flex;
-            align-items: center;
-            padding: 2px 8px;
-            border-radius: 9999px;
-            font-size: 0.75rem;
-            font-weight: 600;
-            margin-top: 12px;
-        }
-        /* Cores de Status mantidas funcionais, mas adaptadas ao Dark Mode */
-        .delta-positive { background-color: rgba(16, 185, 129, 0.2); color: #34d399; }
-        .delta-negative { background-color: rgba(239, 68, 68, 0.2); color: #f87171; }
-        .delta-neutral { background-color: rgba(59, 130, 246, 0.2); color: #60a5fa; }
+def page_marker(page):
+    """Marcador da tela atual; as regras dela no CSS ficam sob .stApp:has(.page-<tela>)"""
+    st.markdown(f'<div class="page-{page}"></div>', unsafe_allow_html=True)
 
-        /* Inputs Modernos com Borda Laranja no Focus */
-        .stSelectbox > div > div {
-            background-color: rgba(255, 255, 255, 0.05) !important;
-            border: 1px solid rgba(255, 255, 255, 0.1) !important;
-            color: white !important;
-            border-radius: 8px !important;
-        }
-        .stSelectbox > div > div:focus-within {
-             border-color: #E37026 !important;
-        }
-        
-        /* Tabs Customizadas */
-        .stTabs [data-baseweb="tab-list"] {
-            gap: 4px;
-            background-color: rgba(255, 255, 255, 0.05);
-            border-radius: 12px;
-            padding: 6px;
-        }
-        .stTabs [data-baseweb="tab"] {
-            height: 40px;
-            border-radius: 8px;
-            border: none !important;
-            color: rgba(255, 255, 255, 0.6);
-        }
-        .stTabs [aria-selected="true"] {
-            background-color: #E37026 !important; /* LARANJA */
-            color: white !important;
-            font-weight: 600;
-        }
-    </style>
-    """, unsafe_allow_html=True)
 
 def card_component(label, value, delta=None, delta_color="neutral"):
     delta_html = ""
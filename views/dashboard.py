@@ -1,8 +1,11 @@
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go  
-import pandas as pd
 import textwrap
+from services.metrics import dashboard_metrics, ALL_PROJECTS
+from services.data_manager import DASHBOARD_TABLES
+from utils.figures import cached_figure
+from utils import profiler
 
 COLOR_MAP = {
     "SIM": "#22c55e", "ANDAMENTO": "#3b82f6", "PENDENTE": "#f59e0b",
@@ -25,48 +28,33 @@ def style_chart(fig):
 def render_dashboard(dm):
     st.markdown("## Dashboard")
     
-    df_all = dm.get_global_dashboard_data()
-    if df_all.empty:
+    # versão lida antes da busca: uma escrita no meio só pode deixar a chave das figuras mais antiga
+    # que os dados (refeitas no próximo rerun), nunca gravar dados antigos sob a versão nova
+    version = dm.data_version(*DASHBOARD_TABLES)
+
+    # Contagens já agregadas no banco (itens reais, status normalizado)
+    data = dm.fetch_many({"counts": ("get_dashboard_aggregates",), "progress": ("get_progress_by_project",)})
+    counts = data["counts"]
+    if counts["status"].empty:
         st.info("Aguardando dados.")
         return
 
-    df_all['status'] = df_all['status'].astype(str).str.strip().str.upper().replace({
-        'NAO SE APLICA': 'NÃO SE APLICA', 'NAO INICIADO': 'NÃO INICIADO', 'CONCLUIDO': 'SIM', 'OK': 'SIM'
-    })
-    
-    df_all['item_number'] = df_all['item_number'].astype(str).str.strip()
-    mask_real = (df_all['item_number'].str.contains(r'\.', regex=True)) & (~df_all['item_number'].str.endswith('.0'))
-    df_raw = df_all[mask_real].copy()
-
-    df_raw['stage'] = df_raw['stage'].fillna("GERAL")
-    df_raw['sector'] = df_raw['sector'].fillna("NÃO DEFINIDO")
-    df_raw['responsible'] = df_raw['responsible'].fillna("NÃO ATRIBUÍDO")
-
-    projects_list = sorted(df_raw['project_name'].unique().tolist())
+    projects_list = sorted(counts["status"]['project_name'].unique().tolist())
     c_filter, _ = st.columns([1, 3])
     with c_filter:
-        sel_project = st.selectbox("Escopo da Análise", ["Todas as Obras"] + projects_list)
+        sel_project = st.selectbox("Escopo da Análise", [ALL_PROJECTS] + projects_list)
 
-    if sel_project != "Todas as Obras":
-        df_calc = df_raw[df_raw['project_name'] == sel_project]
-    else:
-        df_calc = df_raw
+    m = dashboard_metrics(counts, sel_project, progress=data["progress"])
+
+    # figuras reaproveitadas enquanto dados e obra selecionada não mudam
+    def figure(chart_id, build):
+        return cached_figure(version, chart_id, sel_project, build)
 
     st.markdown("---")
         
     st.markdown(f"##### Visão Geral")
     st.markdown("<div style='height:10px'></div>", unsafe_allow_html=True)
     
-  
-    total = len(df_calc)
-    if total > 0:
-        done = len(df_calc[df_calc['status'].isin(['SIM', 'NÃO SE APLICA'])])
-        pending = total - done
-        
-        progresso = int((done / total) * 100)
-    else:
-        done, pending, progresso = 0, 0, 0
-    
     k1, k2, k3, k4 = st.columns(4)
     
     def metric_card(label, val, sub, color):
@@ -78,78 +66,49 @@ def render_dashboard(dm):
         </div>
         """)
     
-    with k1: st.markdown(metric_card("Total", total, "Atividades", "#888"), unsafe_allow_html=True)
-    with k2: st.markdown(metric_card("Progresso", f"{progresso}%", f"{done} Concluídos", "#22c55e"), unsafe_allow_html=True)
-    with k3: st.markdown(metric_card("Risco", pending, "Andamento / Pendentes", "#f59e0b"), unsafe_allow_html=True)
-    
-    df_not_done = df_calc[~df_calc['status'].isin(['SIM', 'NÃO SE APLICA'])]
-
-    if sel_project == "Todas as Obras":
-        risk_proj = df_not_done['project_name'].value_counts()
-        top_risk = risk_proj.index[0] if not risk_proj.empty else "Nenhuma"
-        val_risk = risk_proj.iloc[0] if not risk_proj.empty else 0
-        lbl_risk = "Obra com Mais Pendências"
-    else:
-        risk_sec = df_not_done['sector'].value_counts()
-        top_risk = risk_sec.index[0] if not risk_sec.empty else "Nenhum"
-        val_risk = risk_sec.iloc[0] if not risk_sec.empty else 0
-        lbl_risk = "Gargalo (Setor)"
-        
-    with k4: st.markdown(metric_card(lbl_risk, top_risk, f"{val_risk} Itens", "#E37026"), unsafe_allow_html=True)
+    with k1: st.markdown(metric_card("Total", m["total"], "Atividades", "#888"), unsafe_allow_html=True)
+    with k2: st.markdown(metric_card("Progresso", f"{m['pct']}%", f"{m['done']} Concluídos", "#22c55e"), unsafe_allow_html=True)
+    with k3: st.markdown(metric_card("Risco", m["pending"], "Andamento / Pendentes", "#f59e0b"), unsafe_allow_html=True)
+    with k4: st.markdown(metric_card(m["risk_label"], m["risk_name"], f"{m['risk_value']} Itens", "#E37026"), unsafe_allow_html=True)
 
     st.markdown("---")
 
     g1, g2 = st.columns([1.5, 1])
 
     with g1:
-        if sel_project == "Todas as Obras":
+        if sel_project == ALL_PROJECTS:
             st.markdown("#### Comparativo de Progresso por Obra")
-            
-            proj_stats = []
-            for p in projects_list:
-                p_df = df_all[
-                    (df_all['project_name'] == p) & 
-                    (df_all['item_number'].astype(str).str.strip().str.contains(r'\.', regex=True)) & 
-                    (~df_all['item_number'].astype(str).str.strip().str.endswith('.0'))
-                ]
-                
-                p_tot = len(p_df)
-                p_done = len(p_df[p_df['status'].isin(['SIM', 'NÃO SE APLICA'])])
-                p_pct = (p_done / p_tot) * 100 if p_tot > 0 else 0
-                proj_stats.append({'Obra': p, 'Progresso': p_pct})
-            
-            df_proj = pd.DataFrame(proj_stats).sort_values('Progresso', ascending=True)
-            
-            fig = px.bar(
-                df_proj, x='Progresso', y='Obra', orientation='h',
-                text=df_proj['Progresso'].apply(lambda x: f"{int(x)}%"),
-                color='Progresso', color_continuous_scale=['#333', '#E37026']
-            )
-            fig = style_chart(fig)
-            fig.update_layout(coloraxis_showscale=False)
-            st.plotly_chart(fig, use_container_width=True)
+            def build():
+                df_proj = m["project_progress"]
+                fig = px.bar(
+                    df_proj, x='Progresso', y='Obra', orientation='h',
+                    text=df_proj['Progresso'].apply(lambda x: f"{int(x)}%"),
+                    color='Progresso', color_continuous_scale=['#333', '#E37026']
+                )
+                fig = style_chart(fig)
+                fig.update_layout(coloraxis_showscale=False)
+                return fig
+            profiler.plotly_chart(figure("project_progress", build), use_container_width=True)
         else:
             st.markdown("#### Distribuição (Etapa > Setor)")
             try:
-                df_sun = df_calc.copy()
-                df_sun['stage'] = df_sun['stage'].fillna("N/D")
-                df_sun['sector'] = df_sun['sector'].fillna("GERAL")
-                df_sun['count'] = 1
-                fig = px.sunburst(df_sun, path=['stage', 'sector', 'status'], values='count', color='status', color_discrete_map=COLOR_MAP)
-                fig.update_layout(margin=dict(t=0, l=0, r=0, b=0), paper_bgcolor='rgba(0,0,0,0)', font=dict(family="Inter"))
-                st.plotly_chart(fig, use_container_width=True)
+                def build():
+                    fig = px.sunburst(m["sunburst"], path=['stage', 'sector', 'status'], values='qty', color='status', color_discrete_map=COLOR_MAP)
+                    fig.update_layout(margin=dict(t=0, l=0, r=0, b=0), paper_bgcolor='rgba(0,0,0,0)', font=dict(family="Inter"))
+                    return fig
+                profiler.plotly_chart(figure("sunburst", build), use_container_width=True)
             except: st.info("Dados insuficientes.")
 
     with g2:
         st.markdown("#### Top Pendências")
-        pending_df = df_calc[df_calc['status'] == 'PENDENTE']
-        if not pending_df.empty:
-            gargalos = pending_df['sector'].value_counts().reset_index().head(5)
-            gargalos.columns = ['Setor', 'Qtd']
-            fig_bar = px.bar(gargalos, x='Qtd', y='Setor', orientation='h', color_discrete_sequence=['#E37026'], text="Qtd")
-            fig_bar = style_chart(fig_bar)
-            fig_bar.update_layout(yaxis=dict(autorange="reversed"))
-            st.plotly_chart(fig_bar, use_container_width=True)
+        gargalos = m["top_pending"]
+        if not gargalos.empty:
+            def build():
+                fig_bar = px.bar(gargalos, x='Qtd', y='Setor', orientation='h', color_discrete_sequence=['#E37026'], text="Qtd")
+                fig_bar = style_chart(fig_bar)
+                fig_bar.update_layout(yaxis=dict(autorange="reversed"))
+                return fig_bar
+            profiler.plotly_chart(figure("top_pending", build), use_container_width=True)
         else:
             st.success("Sem pendências críticas.")
 
@@ -159,52 +118,41 @@ def render_dashboard(dm):
         st.markdown("#### Pareto de Gargalos")
         st.caption("Foco em atividades pendentes.")
         
-        df_pending = df_calc[df_calc['status'] == 'PENDENTE']
-        
-        if not df_not_done.empty:
-            pareto_data = df_not_done['sector'].value_counts().reset_index()
-            pareto_data.columns = ['Setor', 'Qtd']
-            pareto_data['Setor'] = pareto_data['Setor'].astype(str)
-            pareto_data['Acumulado'] = pareto_data['Qtd'].cumsum() / pareto_data['Qtd'].sum() * 100
-            
-            fig = go.Figure()
-            fig.add_trace(go.Bar(x=pareto_data['Setor'], y=pareto_data['Qtd'], name='Pendências', text=pareto_data['Qtd'], marker_color='#ff6503', opacity=0.8))
-            fig.add_trace(go.Scatter(x=pareto_data['Setor'], y=pareto_data['Acumulado'], name='Impacto %',  yaxis='y2', line=dict(color='#3b82f6', width=2), mode='lines+markers'))
-            
-            fig.update_layout(
-                yaxis2=dict(overlaying='y', side='right', range=[0, 110], showgrid=False),
-                paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
-                font=dict(family="Inter", color="#cbd5e1"),
-                margin=dict(t=10, l=0, r=0, b=0), legend=dict(orientation="h", y=1.1),
-                xaxis=dict(showgrid=False)
-            )
-            st.plotly_chart(fig, use_container_width=True)
+        pareto_data = m["pareto"]
+        if not pareto_data.empty:
+            def build():
+                fig = go.Figure()
+                fig.add_trace(go.Bar(x=pareto_data['Setor'], y=pareto_data['Qtd'], name='Pendências', text=pareto_data['Qtd'], marker_color='#ff6503', opacity=0.8))
+                fig.add_trace(go.Scatter(x=pareto_data['Setor'], y=pareto_data['Acumulado'], name='Impacto %',  yaxis='y2', line=dict(color='#3b82f6', width=2), mode='lines+markers'))
+                
+                fig.update_layout(
+                    yaxis2=dict(overlaying='y', side='right', range=[0, 110], showgrid=False),
+                    paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
+                    font=dict(family="Inter", color="#cbd5e1"),
+                    margin=dict(t=10, l=0, r=0, b=0), legend=dict(orientation="h", y=1.1),
+                    xaxis=dict(showgrid=False)
+                )
+                return fig
+            profiler.plotly_chart(figure("pareto", build), use_container_width=True)
         else:
             st.success("Sem gargalos pendentes.")
 
     with c2:
         st.markdown("#### Performance por Etapa")
         
-        stage_stats = []
-        for stg in df_calc['stage'].unique():
-            s_df = df_calc[df_calc['stage'] == stg]
-            s_total = len(s_df)
-            if s_total == 0: continue
-            s_done = len(s_df[s_df['status'].isin(['SIM', 'NÃO SE APLICA'])])
-            s_pct = (s_done/s_total) * 100
-            stage_stats.append({'Etapa': str(stg), 'Progresso': s_pct}) 
-            
-        df_stage = pd.DataFrame(stage_stats).sort_values('Progresso')
+        df_stage = m["stage_progress"]
         
         if not df_stage.empty:
-            fig_bar = px.bar(
-                df_stage, x='Progresso', y='Etapa', orientation='h',
-                text=df_stage['Progresso'].apply(lambda x: f"{int(x)}%"), 
-                color='Progresso', color_continuous_scale=['#47362c', '#ff6400']
-            )
-            fig_bar = style_chart(fig_bar) 
-            fig_bar.update_yaxes(autorange="reversed")
-            st.plotly_chart(fig_bar, use_container_width=True)
+            def build():
+                fig_bar = px.bar(
+                    df_stage, x='Progresso', y='Etapa', orientation='h',
+                    text=df_stage['Progresso'].apply(lambda x: f"{int(x)}%"), 
+                    color='Progresso', color_continuous_scale=['#47362c', '#ff6400']
+                )
+                fig_bar = style_chart(fig_bar) 
+                fig_bar.update_yaxes(autorange="reversed")
+                return fig_bar
+            profiler.plotly_chart(figure("stage_progress", build), use_container_width=True)
         else:
             st.info("Sem dados de etapas.")
             
@@ -212,33 +160,24 @@ def render_dashboard(dm):
 
     st.markdown("#### Mapa de Calor: Responsáveis")
     
-    if sel_project == "Todas as Obras":
-        group_col = "project_name"
-        x_label = "Obra"
-    else:
-        group_col = "sector"
-        x_label = "Setor"
-
-    df_not_done = df_calc[~df_calc['status'].isin(['SIM', 'NÃO SE APLICA'])]
-    df_heat = df_not_done.groupby([group_col, 'responsible']).size().reset_index(name='Qtd')
-    
-    if not df_heat.empty:
-        heatmap_data = df_heat.pivot(index='responsible', columns=group_col, values='Qtd').fillna(0)
-        
-        fig_heat = px.imshow(
-            heatmap_data, 
-            labels=dict(x=x_label, y="Responsável", color="Atividades Ativas"),
-            color_continuous_scale=['#47362c', '#ff6400'], 
-            aspect="auto",
-            text_auto=True 
-        )
-        fig_heat.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(family="Inter", color="#cbd5e1"), margin=dict(t=10, l=0, r=0, b=0))
-        st.plotly_chart(fig_heat, use_container_width=True)
+    heatmap_data = m["heatmap"]
+    if not heatmap_data.empty:
+        def build():
+            fig_heat = px.imshow(
+                heatmap_data, 
+                labels=dict(x=m["heatmap_x_label"], y="Responsável", color="Atividades Ativas"),
+                color_continuous_scale=['#47362c', '#ff6400'], 
+                aspect="auto",
+                text_auto=True 
+            )
+            fig_heat.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(family="Inter", color="#cbd5e1"), margin=dict(t=10, l=0, r=0, b=0))
+            return fig_heat
+        profiler.plotly_chart(figure("heatmap", build), use_container_width=True)
     else:
         st.info("Dados insuficientes para mapa de calor.")
 
     st.markdown("#### Radar de Atividades")
-    risk_table = df_calc[df_calc['status'] == 'PENDENTE'][['project_name', 'stage', 'responsible', 'status']].head(10)
-    st.dataframe(risk_table, use_container_width=True, hide_index=True)
+    risk_table = dm.get_pending_items(10, None if sel_project == ALL_PROJECTS else sel_project)
+    profiler.dataframe(risk_table, use_container_width=True, hide_index=True)
 
 
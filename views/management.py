@@ -1,6 +1,12 @@
 import streamlit as st
 import pandas as pd
 import textwrap
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from services import instrumentation
+from services.metrics import phase_metrics, root_ids
+from utils.styles import page_marker
+
+PHASES_PER_PAGE = 10
 
 STATUS_COLORS = {
     "SIM": "#35BE53",         
@@ -10,60 +16,36 @@ STATUS_COLORS = {
 }
 
 def render_management(dm, project_id, project_name):
-    st.markdown("""
-<style>
-/* Remove fundo das colunas */
-div[data-testid="column"] { 
-    background: radial-gradient(circle at 10% 20%, #3b3b3b 0%, #000000 100%);
-    font-family: 'Inter', sans-serif;
-    color: #ffffff;
- }
-
-/* Expander Header Minimalista */
-.streamlit-expanderHeader {
-    background-color: transparent; 
-    background-image: linear-gradient(160deg, #1e1e1f 0%, #0a0a0c 100%);
-    border: 1px solid rgba(255, 255, 255, 0.1) !important;
-    padding: 30px;
-    border-radius: 10px !important;
-    box-shadow: 0 15px 40px rgba(0, 0, 0, 0.7) !important;
-    margin-top: 10px;
-}
-.streamlit-expanderHeader:hover {
-    background-color: transparent !important;
-    background-image: linear-gradient(160deg, #1e1e1f 0%, #0a0a0c 100%) !important;
-    text-decoration: underline;
-}
-.streamlit-expanderContent {
-    border: 1px solid rgba(255, 255, 255, 0.1) !important;
-    padding-left: 12px !important;
-    border-left: 1px dashed rgba(255,255,255,0.1) !important;
-    margin-left: 10px !important;
-}
-/* Selectbox Style */
-.stSelectbox div[data-baseweb="select"] > div {
-    background-color: transparent; 
-    background-image: linear-gradient(160deg, #1e1e1f 0%, #0a0a0c 100%);
-    border-radius: 6px !important;
-    border: transparent;
-    font-size: 0.85rem !important;
-    min-height: 32px !important;
-}
-</style>
-    """, unsafe_allow_html=True)
+    page_marker("management")
 
-    proj_details = dm.get_project_details(project_id)
-    category = proj_details.get("category", "GERAL") if proj_details else "GERAL"
+    # cabeçalho, atividades e contadores numa única consulta
+    bundle = dm.get_project_bundle(project_id)
+    if bundle is None:
+        st.info("Obra não encontrada.")
+        return
+
+    # mudanças do diário local que o banco recusou (ex.: status inválido) ficam visíveis até dispensadas
+    failed = dm.get_failed_statuses(project_id)
+    if not failed.empty:
+        st.warning(f"{len(failed)} alteração(ões) de status não puderam ser gravadas.")
+        with st.expander("Ver alterações recusadas"):
+            st.dataframe(failed[['task_id', 'status', 'error', 'failed_at']], hide_index=True, use_container_width=True)
+            if st.button("Dispensar aviso", key=f"discard_failed_{project_id}"):
+                dm.discard_failed_statuses(project_id)
+                st.rerun()
+
+    category = bundle["header"].get("category") or "GERAL"
     
-    df = dm.get_project_data(project_id)
+    df = bundle["tasks"]
     if df.empty:
         st.info("Nenhuma atividade cadastrada.")
         return
 
-    total_global = len(df)
+    progress = bundle["progress"]
+    total_global = progress["total"]
     if total_global > 0:
-        done_global = len(df[df['status'].isin(['SIM', 'NÃO SE APLICA'])])
-        pending_global = total_global - done_global
+        done_global = progress["done"]
+        pending_global = progress["pending"]
         pct_global = int((done_global / total_global) * 100)
     else:
         done_global, pending_global, pct_global = 0, 0, 0
@@ -120,47 +102,87 @@ div[data-testid="column"] {
 
     st.markdown("<div style='height: 20px;'></div>", unsafe_allow_html=True)
 
-    df['root_id'] = df['item_number'].astype(str).apply(lambda x: x.split('.')[0])
-    unique_roots = sorted(df['root_id'].unique(), key=lambda x: int(x) if x.isdigit() else 999)
+    # item_root vem do banco (chave persistida) e as linhas já chegam em ordem hierárquica
+    df['root_id'] = root_ids(df['item_root'])
+    phase_counts = bundle["phases"]
+    counters = dict(zip(root_ids(phase_counts['item_root']), zip(phase_counts['total'].astype(int), phase_counts['done'].astype(int))))
+
+    c_mode, c_page = st.columns([3, 1])
+    with c_mode:
+        grid_mode = st.toggle("Modo grade", key="mgmt_grid_mode", help="Edita os status de cada fase numa tabela única, carregada só quando aberta.")
+
+    phases = phase_metrics(df, sel_sector, sel_status, counters)
+
+    if not phases:
+        st.warning("Nenhuma atividade encontrada.")
+        return
+
+    n_pages = (len(phases) - 1) // PHASES_PER_PAGE + 1
+    page = 1
+    if n_pages > 1:
+        with c_page:
+            page = st.number_input("Página", min_value=1, max_value=n_pages, value=1, step=1, label_visibility="collapsed")
+        st.caption(f"Página {page} de {n_pages} · {len(phases)} fases")
+
+    for phase in phases[(page - 1) * PHASES_PER_PAGE:page * PHASES_PER_PAGE]:
+        render_phase(dm, project_id, phase, df.iloc[phase["rows"]], sel_sector, sel_status, grid_mode)
+
+
+def _filled(value):
+    """Colunas categóricas trazem NaN (verdadeiro) no lugar de None para valores ausentes"""
+    return pd.notna(value) and value != ""
+
 
-    found_any = False
+def _fragment_rerun():
+    """Rerun disparado por um widget do próprio fragmento (e não pelo script inteiro)"""
+    ctx = get_script_run_ctx()
+    return bool(ctx and ctx.fragment_ids_this_run)
 
-    for root in unique_roots:
-        group_df = df[df['root_id'] == root]
 
-        if not group_df.empty:
-            phase_name_db = group_df.iloc[0]['phase_title'] 
-            phase_label = f"{root} - {phase_name_db}"
-        else:
-            phase_label = f"FASE {root}"
+def _refresh_phase(dm, project_id, phase, rows, sel_sector, sel_status):
+    """Fase e atividades visíveis relidas do bundle (já corrigido pela escrita, ver DataManager.update_statuses)"""
+    bundle = dm.get_project_bundle(project_id)
+    if bundle is None: return None, None
+    tasks = bundle["tasks"]
+    item_root = rows['item_root'].iloc[0]
+    in_phase = tasks['item_root'].isna() if pd.isna(item_root) else tasks['item_root'] == item_root
+    df = tasks[in_phase.to_numpy()].reset_index(drop=True)
+    df['root_id'] = phase["root"]
+    phase_counts = bundle["phases"]
+    counters = dict(zip(root_ids(phase_counts['item_root']), zip(phase_counts['total'].astype(int), phase_counts['done'].astype(int))))
+    phases = phase_metrics(df, sel_sector, sel_status, counters)
+    if not phases: return None, None
+    return phases[0], df.iloc[phases[0]["rows"]]
 
-        children = group_df
 
-        filtered_children = children.copy()
-        if sel_sector != "Todos": filtered_children = filtered_children[filtered_children['sector'] == sel_sector]
-        if sel_status != "Todos": filtered_children = filtered_children[filtered_children['status'] == sel_status]
+@st.fragment
+def render_phase(dm, project_id, phase, rows, sel_sector, sel_status, grid_mode):
+    """Card e atividades de uma fase; uma troca de status reexecuta só este trecho.
 
-        if filtered_children.empty: continue
-        found_any = True
+    No rerun completo a fase e suas linhas chegam prontas de render_management. No rerun do
+    fragmento os argumentos são os do último rerun completo, então a fase é relida do bundle
+    em cache; a barra geral da obra atualiza no próximo rerun completo.
+    """
+    # o rerun só do fragmento não passa pelo begin/end_rerun do main.py: abre o próprio registro
+    with instrumentation.fragment_rerun(st.session_state.get('session_id'), "Gestão (fase)", **dm.get_query_budget()):
+        if _fragment_rerun():
+            phase, rows = _refresh_phase(dm, project_id, phase, rows, sel_sector, sel_status)
+            if phase is None: return
+        _render_phase(dm, project_id, phase, rows, grid_mode)
 
-        total = len(children)
-        if total > 0:
-            done_count = len(children[children['status'].isin(['SIM', 'NÃO SE APLICA'])])
-            pending_count = total - done_count
-            pct = int((done_count / total) * 100)
-        else:
-            done_count = 0
-            pending_count = 0
-            pct = 0
 
-        if pct == 100:
-            border_color = STATUS_COLORS["SIM"]
-            progress_bar_color = STATUS_COLORS["SIM"]
-        else:
-            border_color = "#E37026" 
-            progress_bar_color = "#E37026"
+def _render_phase(dm, project_id, phase, filtered_children, grid_mode):
+    root, phase_label = phase["root"], phase["phase_label"]
+    total, pending_count, pct = phase["total"], phase["pending"], phase["pct"]
 
-        html_card = textwrap.dedent(f"""
+    if pct == 100:
+        border_color = STATUS_COLORS["SIM"]
+        progress_bar_color = STATUS_COLORS["SIM"]
+    else:
+        border_color = "#E37026" 
+        progress_bar_color = "#E37026"
+
+    html_card = textwrap.dedent(f"""
 <div style="background-color: transparent; background-image: linear-gradient(160deg, #1e1e1f 0%, #0a0a0c 100%); border: 1px solid rgba(255, 255, 255, 0.1); border-left: 3px solid {border_color}; border-radius: 8px; padding: 15px 20px; margin-top: 15px; display: flex; align-items: center; justify-content: space-between; backdrop-filter: blur(10px);">
     <div style="font-weight: 600; color: #ffffff; font-size: 1.05rem; letter-spacing: 0.5px; flex-grow: 1;">
         {phase_label}
@@ -187,51 +209,89 @@ div[data-testid="column"] {
     </div>
 </div>
 """)
-        st.markdown(html_card, unsafe_allow_html=True)
-        st.markdown("<div style='margin-bottom: 2px'></div>", unsafe_allow_html=True)
-
-        with st.expander("Ver atividades", expanded=False):
-            for _, row in filtered_children.iterrows():
-                current_status = row['status']
-                if current_status not in STATUS_COLORS: current_status = "PENDENTE"
-                status_color = STATUS_COLORS.get(current_status, "#64748b")
-
-                with st.container():
-                    c_vis, c_info, c_act = st.columns([0.05, 3.5, 1.2])
-
-                    with c_vis:
-                        st.markdown(f"""<div style="height:100%; min-height:60px; width:4px; background:{status_color}; border-radius:4px; margin-top:4px;"></div>""", unsafe_allow_html=True)
-
-                    with c_info:
-                        st.markdown(f"<div style='font-weight:500; color:#fff; font-size:0.95rem;'>{row['item_number']} - {row['title']}</div>", unsafe_allow_html=True)
-                        if row['description']:
-                            st.markdown(f"<div style='color:#aaa; font-size:0.85rem; margin-top:3px; line-height:1.4;'>{row['description']}</div>", unsafe_allow_html=True)
-
-                        tags = []
-                        if row['responsible']:
-                            tags.append(f"<span style='background:rgba(227, 112, 38, 0.15); padding:2px 8px; border-radius:4px; font-size:0.7rem; color:#E37026; border:1px solid rgba(227, 112, 38, 0.2);'> {row['responsible']}</span>")
-                        if row['sector']: 
-                            tags.append(f"<span style='background:rgba(255,255,255,0.1); padding:2px 8px; border-radius:4px; font-size:0.7rem; color:#ccc; border:1px solid rgba(255,255,255,0.3);'> {row['sector']}</span>")
-                        if row['stage']:
-                            tags.append(f"<span style='background:rgba(59, 130, 246, 0.1); padding:2px 8px; border-radius:4px; font-size:0.7rem; color:#60a5fa; border:1px solid rgba(59, 130, 246, 0.2);'> {row['stage']}</span>")
-                        if row['area']: 
-                            tags.append(f"<span style='background:rgba(255,255,255,0.05); padding:2px 8px; border-radius:4px; font-size:0.7rem; color:#ccc; border:1px solid rgba(255,255,255,0.1);'>{row['area']}</span>")
-
-                        if tags:
-                            st.markdown(f"<div style='margin-top:8px; display:flex; gap:8px; align-items:center; flex-wrap:wrap;'>{''.join(tags)}</div>", unsafe_allow_html=True)
-                    
-                    with c_act:
-                        key_unique = f"st_{project_id}_{row['task_id']}"
-                        opts = list(STATUS_COLORS.keys())
-
-                        def on_change(tid=row['task_id'], pid=project_id, k=key_unique):
-                            dm.update_single_status(pid, tid, st.session_state[k])
-
-                        idx = opts.index(current_status) if current_status in opts else 1
-                        st.markdown("")
-                        st.selectbox("Status", opts, index=idx, key=key_unique, on_change=on_change, label_visibility="collapsed")
-
-                st.markdown("<div style='border-bottom:1px solid rgba(255,255,255,0.05); margin: 10px 0;'></div>", unsafe_allow_html=True)
-
-    if not found_any:
-        st.warning("Nenhuma atividade encontrada.")
+    st.markdown(html_card, unsafe_allow_html=True)
+    st.markdown("<div style='margin-bottom: 2px'></div>", unsafe_allow_html=True)
+
+    if grid_mode:
+        # Conteúdo só é montado quando a fase é aberta (expanders montam tudo mesmo fechados)
+        if st.toggle("Ver atividades", key=f"open_{project_id}_{root}"):
+            render_phase_grid(dm, project_id, root, filtered_children)
+        return
+
+    with st.expander("Ver atividades", expanded=False):
+        for _, row in filtered_children.iterrows():
+            current_status = row['status']
+            if current_status not in STATUS_COLORS: current_status = "PENDENTE"
+            status_color = STATUS_COLORS.get(current_status, "#64748b")
+
+            with st.container():
+                c_vis, c_info, c_act = st.columns([0.05, 3.5, 1.2])
+
+                with c_vis:
+                    st.markdown(f"""<div style="height:100%; min-height:60px; width:4px; background:{status_color}; border-radius:4px; margin-top:4px;"></div>""", unsafe_allow_html=True)
+
+                with c_info:
+                    st.markdown(f"<div style='font-weight:500; color:#fff; font-size:0.95rem;'>{row['item_number']} - {row['title']}</div>", unsafe_allow_html=True)
+                    if row['description']:
+                        st.markdown(f"<div style='color:#aaa; font-size:0.85rem; margin-top:3px; line-height:1.4;'>{row['description']}</div>", unsafe_allow_html=True)
+
+                    tags = []
+                    if _filled(row['responsible']):
+                        tags.append(f"<span style='background:rgba(227, 112, 38, 0.15); padding:2px 8px; border-radius:4px; font-size:0.7rem; color:#E37026; border:1px solid rgba(227, 112, 38, 0.2);'> {row['responsible']}</span>")
+                    if _filled(row['sector']):
+                        tags.append(f"<span style='background:rgba(255,255,255,0.1); padding:2px 8px; border-radius:4px; font-size:0.7rem; color:#ccc; border:1px solid rgba(255,255,255,0.3);'> {row['sector']}</span>")
+                    if _filled(row['stage']):
+                        tags.append(f"<span style='background:rgba(59, 130, 246, 0.1); padding:2px 8px; border-radius:4px; font-size:0.7rem; color:#60a5fa; border:1px solid rgba(59, 130, 246, 0.2);'> {row['stage']}</span>")
+                    if row['area']: 
+                        tags.append(f"<span style='background:rgba(255,255,255,0.05); padding:2px 8px; border-radius:4px; font-size:0.7rem; color:#ccc; border:1px solid rgba(255,255,255,0.1);'>{row['area']}</span>")
+
+                    if tags:
+                        st.markdown(f"<div style='margin-top:8px; display:flex; gap:8px; align-items:center; flex-wrap:wrap;'>{''.join(tags)}</div>", unsafe_allow_html=True)
+                
+                with c_act:
+                    key_unique = f"st_{project_id}_{row['task_id']}"
+                    opts = list(STATUS_COLORS.keys())
+
+                    def on_change(tid=row['task_id'], pid=project_id, k=key_unique):
+                        dm.update_single_status(pid, tid, st.session_state[k])
+
+                    idx = opts.index(current_status) if current_status in opts else 1
+                    st.markdown("")
+                    st.selectbox("Status", opts, index=idx, key=key_unique, on_change=on_change, label_visibility="collapsed")
+
+            st.markdown("<div style='border-bottom:1px solid rgba(255,255,255,0.05); margin: 10px 0;'></div>", unsafe_allow_html=True)
+
+
+def render_phase_grid(dm, project_id, root, rows):
+    """Atividades de uma fase numa única grade editável (status como selectbox)"""
+    key = f"grid_{project_id}_{root}"
+    grid = rows[['task_id', 'item_number', 'title', 'sector', 'responsible', 'stage', 'status']].reset_index(drop=True)
+    grid['status'] = grid['status'].where(grid['status'].isin(list(STATUS_COLORS)), "PENDENTE")
+
+    def on_change():
+        edits = st.session_state[key].get("edited_rows", {})
+        changes = [
+            (project_id, int(grid.at[int(pos), 'task_id']), vals['status'])
+            for pos, vals in edits.items()
+            if vals.get('status') and vals['status'] != grid.at[int(pos), 'status']
+        ]
+        if changes and not dm.save_statuses(changes):
+            st.toast("Erro ao salvar status.", icon="⚠️")
+
+    st.data_editor(
+        grid,
+        key=key,
+        on_change=on_change,
+        hide_index=True,
+        use_container_width=True,
+        disabled=['item_number', 'title', 'sector', 'responsible', 'stage'],
+        column_config={
+            "task_id": None,
+            "item_number": st.column_config.TextColumn("Item", width="small"),
+            "title": st.column_config.TextColumn("Atividade", width="large"),
+            "sector": st.column_config.TextColumn("Setor"),
+            "responsible": st.column_config.TextColumn("Responsável"),
+            "stage": st.column_config.TextColumn("Etapa", width="small"),
+            "status": st.column_config.SelectboxColumn("Status", options=list(STATUS_COLORS), required=True),
+        },
+    )
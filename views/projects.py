@@ -1,42 +1,12 @@
 import streamlit as st
 import pandas as pd
 import textwrap
+from utils.styles import page_marker
 
 PROJECT_TYPES = ["MULTIFAMILIAR", "COMERCIAL", "USO MISTO", "UNIFAMILIAR"]
 
 def render_projects(dm):
-    st.markdown("""
-    <style>
-        /* Card Estilizado */
-        div.project-card {
-            background-color: transparent; 
-            background-image: linear-gradient(160deg, #1e1e1f 0%, #0a0a0c 100%);
-            border: 1px solid rgba(255, 255, 255, 0.1);
-            border-radius: 8px;
-            padding: 20px;
-            transition: transform 0.2s;
-            margin-top: 10px;    
-            margin-bottom: 5px;
-        }
-        div.project-card:hover {
-            border-color: #E37026;
-            background: rgba(227, 112, 38, 0.05);
-        }
-        
-        /* Badge de Categoria */
-        .category-badge {
-            background: rgba(227, 112, 38, 0.15); 
-            border: 1px solid rgba(227, 112, 38, 0.5); 
-            color: #E37026; 
-            padding: 4px 8px;
-            border-radius: 4px;
-            font-size: 0.65rem; 
-            font-weight: 600; 
-            letter-spacing: 1px;
-            margin-bottom: 20px;
-        }
-    </style>
-    """, unsafe_allow_html=True)
+    page_marker("projects")
 
     st.markdown("## Gerenciar Obras")
 
@@ -1,37 +1,31 @@
 import streamlit as st
 import pandas as pd
 from sqlalchemy import text
+from services import instrumentation
+from utils.styles import page_marker
 
 def render_settings(dm):
-    st.markdown("""
-    <style>
-        /* Tabs Modernas */
-        .stTabs [data-baseweb="tab-list"] { gap: 24px; border-bottom: 1px solid rgba(255,255,255,0.1); }
-        .stTabs [data-baseweb="tab"] { height: 50px; white-space: pre-wrap; color: #94a3b8; font-weight: 500; }
-        .stTabs [aria-selected="true"] { color: #E37026 !important; border-bottom-color: #E37026 !important; }
-        
-        /* Container dos Filtros */
-        .filter-container {
-            background-color: rgba(255,255,255,0.02);
-            border: 1px solid rgba(255,255,255,0.05);
-            border-radius: 8px;
-            padding: 15px;
-            margin-bottom: 20px;
-        }
-    </style>
-    """, unsafe_allow_html=True)
+    page_marker("settings")
 
     st.markdown("## Configurações")
     
-    tab_activities, tab_lists = st.tabs(["Gerenciar Atividades", "Listas Auxiliares"])
+    # Aba de diagnóstico oculta: só com [database] diagnostics = true
+    show_diag = dm.diagnostics_enabled()
+    tabs = st.tabs(["Gerenciar Atividades", "Listas Auxiliares"] + (["Diagnóstico"] if show_diag else []))
+    tab_activities, tab_lists = tabs[0], tabs[1]
+    if show_diag:
+        with tabs[2]: render_diagnostics(dm)
 
     with tab_activities:
         st.markdown("#### Inventário de Atividades")
         st.caption("Edite em massa setores, responsáveis e dependências. Use os filtros para encontrar itens rapidamente.")
 
-        df_tasks = dm.get_all_tasks_admin()
-        df_sectors = dm.get_aux_list('sectors')
-        df_resps = dm.get_aux_list('responsibles')
+        data = dm.fetch_many({
+            "tasks": ("get_all_tasks_admin",),
+            "sectors": ("get_aux_list", "sectors"),
+            "responsibles": ("get_aux_list", "responsibles"),
+        })
+        df_tasks, df_sectors, df_resps = data["tasks"], data["sectors"], data["responsibles"]
         
         opt_sectors = sorted(df_sectors['name'].tolist()) if not df_sectors.empty else []
         opt_resps = sorted(df_resps['name'].tolist()) if not df_resps.empty else []
@@ -113,9 +107,12 @@ def render_settings(dm):
         with col_save:
             if st.button("Salvar Alterações", type="primary"):
                 try:
-                    dm.save_task_changes(edited_df)
-                    st.toast("Banco de dados atualizado!", icon="✅")
-                    st.rerun()
+                    changed = dm.save_task_changes(edited_df, df_filtered)
+                    if changed:
+                        st.toast(f"Banco de dados atualizado! {changed} atividade(s) alterada(s).", icon="✅")
+                        st.rerun()
+                    else:
+                        st.toast("Nenhuma alteração para salvar.", icon="ℹ️")
                 except Exception as e:
                     st.error(f"Erro ao salvar: {e}")
 
@@ -127,7 +124,7 @@ def render_settings(dm):
 
         with c1:
             st.markdown("**Setores**")
-            df_sec = dm.get_aux_list('sectors')
+            df_sec = df_sectors
             edit_sec = st.data_editor(
                 df_sec, 
                 key="edit_sectors", 
@@ -137,13 +134,16 @@ def render_settings(dm):
                 column_config={"id": None, "name": "Nome"}
             )
             if st.button("Salvar Setores"):
-                dm.update_aux_list('sectors', edit_sec)
-                st.success("Setores atualizados.")
-                st.rerun()
+                res = dm.update_aux_list('sectors', edit_sec)
+                if res["conflicts"]:
+                    st.warning("Nomes já existentes (não renomeados): " + ", ".join(res["conflicts"]))
+                else:
+                    st.toast(f"Setores atualizados: {res['renamed']} renomeado(s), {res['inserted']} incluído(s).", icon="✅")
+                    st.rerun()
 
         with c2:
             st.markdown("**Responsáveis**")
-            df_resp = dm.get_aux_list('responsibles')
+            df_resp = df_resps
             edit_resp = st.data_editor(
                 df_resp, 
                 key="edit_resps", 
@@ -153,6 +153,44 @@ def render_settings(dm):
                 column_config={"id": None, "name": "Nome"}
             )
             if st.button("Salvar Responsáveis"):
-                dm.update_aux_list('responsibles', edit_resp)
-                st.success("Responsáveis atualizados.")
-                st.rerun()
\ No newline at end of file
+                res = dm.update_aux_list('responsibles', edit_resp)
+                if res["conflicts"]:
+                    st.warning("Nomes já existentes (não renomeados): " + ", ".join(res["conflicts"]))
+                else:
+                    st.toast(f"Responsáveis atualizados: {res['renamed']} renomeado(s), {res['inserted']} incluído(s).", icon="✅")
+                    st.rerun()
+
+
+def render_diagnostics(dm):
+    """Consultas por rerun/tela (hooks do engine) e estado do pool de conexões"""
+    st.markdown("#### Pool de Conexões")
+    pool = dm.get_pool_stats()
+    cols = st.columns(4)
+    cols[0].metric("Em uso", f"{pool.get('checked_out', 0)} / {pool.get('pool_size', 0)}")
+    cols[1].metric("Overflow", f"{pool.get('overflow', 0)} / {pool.get('max_overflow', 0)}")
+    cols[2].metric("Espera média", f"{pool.get('wait_avg_ms', 0)} ms")
+    cols[3].metric("Espera máxima", f"{pool.get('wait_max_ms', 0)} ms")
+
+    budget = dm.get_query_budget()
+    st.markdown("#### Consultas por Rerun")
+    st.caption(f"Orçamento por rerun: {budget['budget_queries'] or '∞'} consultas / {budget['budget_ms'] or '∞'} ms de banco.")
+
+    reruns = instrumentation.recent_reruns(st.session_state.get('session_id'))
+    current = instrumentation.current_rerun()
+    if current: reruns = reruns + [current]
+    if not reruns:
+        st.info("Nenhuma consulta registrada nesta sessão.")
+        return
+
+    summary = pd.DataFrame([r.summary() for r in reversed(reruns)])
+    st.dataframe(summary, use_container_width=True, hide_index=True)
+
+    by_id = {r.id: r for r in reruns}
+    sel = st.selectbox("Rerun", list(reversed(list(by_id))), format_func=lambda i: f"#{i} • {by_id[i].view or '-'}")
+    queries = pd.DataFrame(by_id[sel].queries, columns=["ms", "rows", "method", "statement"])
+    if queries.empty:
+        st.caption("Rerun sem consultas ao banco.")
+        return
+    by_method = queries.groupby("method").agg(consultas=("ms", "size"), ms=("ms", "sum"), linhas=("rows", "sum"))
+    st.dataframe(by_method.sort_values("ms", ascending=False).round(2), use_container_width=True)
+    st.dataframe(queries.sort_values("ms", ascending=False), use_container_width=True, hide_index=True)